@@ -1,10 +1,154 @@
 import sys
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QVBoxLayout,
-    QScrollArea, QGridLayout
+    QScrollArea, QGridLayout, QHBoxLayout, QProgressBar
 )
 from PyQt6.QtGui import QPainter, QPixmap, QPolygon, QColor, QPainterPath, QIcon
-from PyQt6.QtCore import Qt, QPoint
+from PyQt6.QtCore import Qt, QPoint, QObject, QRunnable, QThreadPool, pyqtSignal
+
+from drawing_bot_api import DrawingBot
+from drawing_bot_api.shapes import Line, Circle, PartialCircle
+from drawing_bot_api.supervisor import ensure_bridge_running
+
+TRIANGLE_POINTS = [(50, 20), (30, 70), (70, 70)]
+STAR_POINTS = [
+    (50, 20), (60, 40), (80, 40),
+    (65, 55), (70, 75), (50, 65),
+    (30, 75), (35, 55), (20, 40),
+    (40, 40)
+]
+SHAPE_CENTER = (0, 95)  # mm, middle of DOMAIN_BOX
+ICON_SCALE = 0.8        # mm per icon pixel
+
+
+def polygon(points):
+    return [Line(points[i], points[(i + 1) % len(points)]) for i in range(len(points))]
+
+
+def icon_to_mm(points):
+    # icon coordinates (100 x 100 px, y down) to mm around SHAPE_CENTER
+    return [[SHAPE_CENTER[0] + (x - 50) * ICON_SCALE, SHAPE_CENTER[1] + (50 - y) * ICON_SCALE] for x, y in points]
+
+
+def robot_shapes(shape_name):
+    # drawing_bot_api shapes of a button, in mm inside the robot's domain
+    x, y = SHAPE_CENTER
+    if shape_name == "line":
+        return [Line([x - 30, y], [x + 30, y])]
+    if shape_name == "square":
+        return polygon([[x - 20, y - 20], [x - 20, y + 20], [x + 20, y + 20], [x + 20, y - 20]])
+    if shape_name == "triangle":
+        return polygon(icon_to_mm(TRIANGLE_POINTS))
+    if shape_name == "star":
+        return polygon(icon_to_mm(STAR_POINTS))
+    if shape_name == "heart":
+        return [Line([x, y - 20], [x - 20, y + 5]),
+                PartialCircle([x - 20, y + 5], [x, y + 5], 10, -1),
+                PartialCircle([x, y + 5], [x + 20, y + 5], 10, -1),
+                Line([x + 20, y + 5], [x, y - 20])]
+    if shape_name == "circle":
+        return [Circle([x, y], 20)]
+    raise ValueError(f"Unknown shape: {shape_name}")
+
+
+class DrawingJob(QRunnable):
+    # One shape: plans (samples + preflight) and draws it in a thread of the executor's pool.
+    # execute() blocks in accept() and the paced send, here that only blocks the pool thread.
+    def __init__(self, executor, shape_name):
+        super().__init__()
+        self.executor = executor
+        self.shape_name = shape_name
+        self.generation = executor.generation  # the job is cancelled once the executor's generation changed
+
+    def cancelled(self):
+        return self.generation != self.executor.generation
+
+    def run(self):
+        executor, name = self.executor, self.shape_name
+        bot = executor.bot
+        if self.cancelled():
+            return
+        executor.started.emit(name)
+        try:
+            if ensure_bridge_running() is None:
+                executor.failed.emit(name, "No serial bridge, see the bridge log")
+                return
+            if self.cancelled():
+                executor.finished.emit(name, 1)
+                return
+            for shape in robot_shapes(name):
+                bot.add_shape(shape)
+            report = bot.preflight()
+            if not report:
+                bot.shapes.clear()
+                executor.failed.emit(name, str(report))
+                return
+            total = len(report.angles) * bot._messages_per_point()
+            executor.planned.emit(name, len(report.angles))
+
+            last_percent = [-1]
+
+            def progress(index):
+                # a Cancel between the check below and the start of the send is caught at the first message
+                if self.cancelled():
+                    bot.abort()
+                # at most 100 signals per drawing, the GUI thread is not flooded
+                percent = min(100, 100 * (index + 1) // total)
+                if percent != last_percent[0]:
+                    last_percent[0] = percent
+                    executor.progress.emit(name, percent)
+
+            bot.progress = progress
+            if self.cancelled():
+                bot.shapes.clear()
+                executor.finished.emit(name, 1)
+                return
+            result = bot.execute(promting=False)
+            executor.finished.emit(name, result or 0)
+        except Exception as e:
+            bot.shapes.clear()
+            executor.failed.emit(name, str(e))
+
+
+class DrawingExecutor(QObject):
+    # Draws the submitted shapes one after another without blocking the Qt event loop.
+    # The pool has one thread, further shapes wait in submission order until the current one is drawn.
+    started = pyqtSignal(str)
+    planned = pyqtSignal(str, int)    # number of points
+    progress = pyqtSignal(str, int)   # percent of the messages sent
+    finished = pyqtSignal(str, int)   # 0 if the drawing was completed, 1 if it was aborted
+    failed = pyqtSignal(str, str)
+    queue_changed = pyqtSignal(list)  # names of the shapes waiting
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.bot = DrawingBot(verbose=0)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.queued = []
+        self.generation = 0  # incremented by cancel(), jobs submitted before do not draw
+        self.started.connect(self.on_started)
+
+    def submit(self, shape_name):
+        self.queued.append(shape_name)
+        self.pool.start(DrawingJob(self, shape_name))
+        self.queue_changed.emit(list(self.queued))
+
+    def on_started(self, shape_name):
+        if self.queued and self.queued[0] == shape_name:
+            self.queued.pop(0)
+        self.queue_changed.emit(list(self.queued))
+
+    def cancel(self):
+        # drops the waiting shapes and aborts the one that is planning or drawing
+        self.generation += 1
+        self.pool.clear()
+        self.queued.clear()
+        self.bot.abort()
+        self.queue_changed.emit([])
+
+    def wait(self, milliseconds=-1):
+        return self.pool.waitForDone(milliseconds)
 
 
 class ShapeButton(QPushButton):
@@ -32,15 +176,10 @@ class ShapeButton(QPushButton):
         elif self.shape_name == "square":
             painter.drawRect(30, 30, 40, 40)
         elif self.shape_name == "triangle":
-            points = [QPoint(50, 20), QPoint(30, 70), QPoint(70, 70)]
+            points = [QPoint(x, y) for x, y in TRIANGLE_POINTS]
             painter.drawPolygon(QPolygon(points))
         elif self.shape_name == "star":
-            points = [
-                QPoint(50, 20), QPoint(60, 40), QPoint(80, 40),
-                QPoint(65, 55), QPoint(70, 75), QPoint(50, 65),
-                QPoint(30, 75), QPoint(35, 55), QPoint(20, 40),
-                QPoint(40, 40)
-            ]
+            points = [QPoint(x, y) for x, y in STAR_POINTS]
             painter.drawPolygon(QPolygon(points))
         elif self.shape_name == "heart":
             path = QPainterPath()
@@ -109,6 +248,28 @@ class ShapeSelector(QWidget):
 
         main_layout.addWidget(scroll_area)
 
+        # Drawing status, the robot draws in the background and further shapes are queued
+        self.executor = DrawingExecutor(self)
+        self.executor.started.connect(lambda name: self.status_label.setText(f"Planning {name} ..."))
+        self.executor.planned.connect(self.on_planned)
+        self.executor.progress.connect(lambda name, percent: self.progress_bar.setValue(percent))
+        self.executor.finished.connect(self.on_finished)
+        self.executor.failed.connect(lambda name, message: self.status_label.setText(f"{name.capitalize()} failed: {message}"))
+        self.executor.queue_changed.connect(self.on_queue_changed)
+
+        status_layout = QHBoxLayout()
+        self.status_label = QLabel("Select a shape to draw it.")
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.queue_label = QLabel("")
+        cancel_button = QPushButton("Cancel")
+        cancel_button.clicked.connect(self.executor.cancel)
+        status_layout.addWidget(self.status_label)
+        status_layout.addWidget(self.progress_bar, stretch=1)
+        status_layout.addWidget(self.queue_label)
+        status_layout.addWidget(cancel_button)
+        main_layout.addLayout(status_layout)
+
     def on_shape_selected(self, button, shape_name):
         print(f"Shape selected: {shape_name}")
 
@@ -116,8 +277,26 @@ class ShapeSelector(QWidget):
         for b in self.shape_buttons:
             b.set_selected(b == button)
 
-        # 🔧 Replace this with your robot drawing function
-        # e.g., self.robot.draw_shape(shape_name)
+        self.executor.submit(shape_name)
+
+    def on_planned(self, shape_name, points):
+        self.status_label.setText(f"Drawing {shape_name} ({points} points)")
+        self.progress_bar.setValue(0)
+
+    def on_finished(self, shape_name, result):
+        self.status_label.setText(f"{shape_name.capitalize()} {'aborted' if result else 'done'}.")
+
+    def on_queue_changed(self, names):
+        self.queue_label.setText(f"Next: {', '.join(names)}" if names else "")
+
+    def shutdown(self):
+        # called by MainWindow on exit, closeEvent only reaches the widget when it runs on its own
+        self.executor.cancel()
+        self.executor.wait(2000)
+
+    def closeEvent(self, event):
+        self.shutdown()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,311 @@
+
+import sys
+import time
+import queue
+import numpy as np
+from PyQt6.QtWidgets import (
+    QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout
+)
+from PyQt6.QtGui import QPainter, QPen, QColor, QPolygonF
+from PyQt6.QtCore import Qt, QThread, QPointF, QRectF, pyqtSignal
+
+from drawing_bot_api import DrawingBot
+from drawing_bot_api.config import DOMAIN_BOX, JOG_PERIOD
+from drawing_bot_api.supervisor import ensure_bridge_running
+
+# Freehand strokes are smoothed and resampled while they are drawn and streamed to the robot point by point.
+# The robot has no pen lift, it also draws the way from the end of one stroke to the start of the next one.
+STEP_MM = 1.0           # spacing of the resampled points, one point per JOG_PERIOD -> at most 200 mm/s pen speed
+SMOOTHING = 0.35        # weight of a new cursor position in the moving average (1 = no smoothing)
+MAX_BACKLOG = 40        # points, a longer backlog (fast hand) is thinned out so the pen catches up
+READOUT_INTERVAL = 100  # ms between two updates of the latency readout
+
+
+def domain_rect():
+    # DOMAIN_BOX as (x min, y min, x max, y max) in mm
+    xs = [p[0] for p in DOMAIN_BOX]
+    ys = [p[1] for p in DOMAIN_BOX]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class StrokeFilter:
+    # Incremental smoothing + resampling of one stroke: add() returns the points that are new since the last call,
+    # spaced STEP_MM along the smoothed path, so the stream does not depend on the event rate of mouse or tablet.
+    def __init__(self, step=STEP_MM, smoothing=SMOOTHING):
+        self.step = step
+        self.smoothing = smoothing
+        self.smoothed = None
+        self.carry = 0.0  # distance along the next segment until the next point
+
+    def start(self, point):
+        self.smoothed = np.asarray(point, dtype=float)
+        self.carry = self.step
+        return [self.smoothed.copy()]
+
+    def add(self, point):
+        previous = self.smoothed
+        self.smoothed = previous + self.smoothing * (np.asarray(point, dtype=float) - previous)
+        delta = self.smoothed - previous
+        length = float(np.hypot(*delta))
+        points = []
+        position = self.carry
+        while position <= length:
+            points.append(previous + delta * (position / length))
+            position += self.step
+        self.carry = position - length
+        return points
+
+    def finish(self, point):
+        # the end of the stroke is where the cursor was released, not where the average lags behind
+        points = self.add(point)
+        points.append(np.asarray(point, dtype=float))
+        self.smoothed = None
+        return points
+
+
+class StrokeStreamer(QThread):
+    # Sends the resampled points to the robot through DrawingBot.jog(), one per JOG_PERIOD in the order they were drawn.
+    # Runs the blocking parts (bridge start, accept, pacing) off the GUI thread, the GUI only puts points into a queue.
+    latency = pyqtSignal(float, float)  # ms since the cursor was at the point sent last, mm between cursor and pen
+    pen_moved = pyqtSignal(float, float)
+    status = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.points = queue.Queue()  # (x, y, time.monotonic() of the cursor event) in mm
+        self.cursor = None
+
+    def put(self, points, timestamp):
+        for point in points:
+            self.points.put((point[0], point[1], timestamp))
+        if points:
+            self.cursor = points[-1]
+
+    def run(self):
+        self.status.emit("Starting serial bridge ...")
+        if ensure_bridge_running() is None:
+            self.status.emit("No serial bridge, see the bridge log")
+            return
+        self.status.emit("Waiting for serial_com.py connection ...")
+        try:
+            bot = DrawingBot(verbose=0)
+            with bot.jog() as jog:
+                self.status.emit("Connected, draw on the canvas")
+                self.stream(jog)
+        except OSError as e:
+            self.status.emit(f"Connection failed: {e}")
+            return
+        self.status.emit("Disconnected")
+
+    def stream(self, jog):
+        next_send = time.monotonic()
+        next_readout = 0.0
+        while not self.isInterruptionRequested():
+            try:
+                backlog = [self.points.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            while not self.points.empty():
+                backlog.append(self.points.get_nowait())
+            if len(backlog) > MAX_BACKLOG:
+                # keep every k-th point, the shape stays and the last one is always sent
+                backlog = backlog[::int(np.ceil(len(backlog) / MAX_BACKLOG))] + [backlog[-1]]
+
+            for x, y, timestamp in backlog:
+                time.sleep(max(0.0, next_send - time.monotonic()))
+                next_send = max(next_send + JOG_PERIOD, time.monotonic())
+                jog.move([x, y])
+                now = time.monotonic()
+                if now >= next_readout:
+                    next_readout = now + READOUT_INTERVAL / 1000
+                    cursor = self.cursor if self.cursor is not None else (x, y)
+                    self.latency.emit(1000 * (now - timestamp), float(np.hypot(cursor[0] - x, cursor[1] - y)))
+                    self.pen_moved.emit(x, y)
+                if self.isInterruptionRequested():
+                    return
+
+
+class FreehandCanvas(QWidget):
+    # Drawing area showing DOMAIN_BOX, every cursor position is mapped into it (the aspect ratio is kept).
+    stroke_points = pyqtSignal(list, float)  # new resampled points in mm, time.monotonic() of the cursor event
+
+    def __init__(self):
+        super().__init__()
+        self.setMinimumSize(500, 250)
+        self.filter = StrokeFilter()
+        self.strokes = []  # resampled points in mm, one list per stroke
+        self.pen = None    # last point sent to the robot
+        self.drawing = False
+
+    # ---------- mm <-> widget ----------
+    def domain_area(self):
+        x_min, y_min, x_max, y_max = domain_rect()
+        margin = 10
+        scale = min((self.width() - 2 * margin) / (x_max - x_min), (self.height() - 2 * margin) / (y_max - y_min))
+        width, height = scale * (x_max - x_min), scale * (y_max - y_min)
+        return QRectF((self.width() - width) / 2, (self.height() - height) / 2, width, height), scale
+
+    def to_mm(self, position):
+        area, scale = self.domain_area()
+        x_min, y_min, x_max, y_max = domain_rect()
+        x = np.clip(x_min + (position.x() - area.left()) / scale, x_min, x_max)
+        y = np.clip(y_max - (position.y() - area.top()) / scale, y_min, y_max)
+        return np.array([x, y])
+
+    def to_widget(self, point):
+        area, scale = self.domain_area()
+        x_min, y_min, x_max, y_max = domain_rect()
+        return QPointF(area.left() + (point[0] - x_min) * scale, area.top() + (y_max - point[1]) * scale)
+
+    # ---------- input ----------
+    def press(self, position):
+        self.drawing = True
+        points = self.filter.start(self.to_mm(position))
+        self.strokes.append(list(points))
+        self.emit_points(points)
+
+    def move(self, position):
+        if self.drawing:
+            points = self.filter.add(self.to_mm(position))
+            self.strokes[-1].extend(points)
+            self.emit_points(points)
+
+    def release(self, position):
+        if self.drawing:
+            self.drawing = False
+            points = self.filter.finish(self.to_mm(position))
+            self.strokes[-1].extend(points)
+            self.emit_points(points)
+
+    def emit_points(self, points):
+        if points:
+            self.stroke_points.emit(points, time.monotonic())
+            self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.press(event.position())
+
+    def mouseMoveEvent(self, event):
+        self.move(event.position())
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.release(event.position())
+
+    def tabletEvent(self, event):
+        # tablets report at a higher rate than the synthesized mouse events
+        kind = event.type()
+        if kind == event.Type.TabletPress:
+            self.press(event.position())
+        elif kind == event.Type.TabletMove:
+            self.move(event.position())
+        elif kind == event.Type.TabletRelease:
+            self.release(event.position())
+        event.accept()
+
+    def clear(self):
+        self.strokes = []
+        self.update()
+
+    def set_pen(self, x, y):
+        self.pen = (x, y)
+        self.update()
+
+    # ---------- painting ----------
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor("white"))
+
+        area, _ = self.domain_area()
+        painter.setPen(QPen(QColor("#e5e7eb"), 1, Qt.PenStyle.DashLine))
+        painter.drawRect(area)
+
+        painter.setPen(QPen(QColor("#2563eb"), 2))
+        for stroke in self.strokes:
+            if len(stroke) > 1:
+                painter.drawPolyline(QPolygonF([self.to_widget(p) for p in stroke]))
+
+        if self.pen is not None:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor("#ec4899"))
+            painter.drawEllipse(self.to_widget(self.pen), 5, 5)
+        painter.end()
+
+
+class FreehandTab(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.streamer = None
+
+        main_layout = QVBoxLayout(self)
+
+        prompt_label = QLabel("Draw freehand, the robot follows the pen:")
+        prompt_label.setStyleSheet("font-size: 16px; font-weight: bold;")
+        main_layout.addWidget(prompt_label)
+
+        self.canvas = FreehandCanvas()
+        self.canvas.stroke_points.connect(self.on_stroke_points)
+        main_layout.addWidget(self.canvas, stretch=1)
+
+        controls = QHBoxLayout()
+        self.connect_button = QPushButton("Connect robot")
+        self.connect_button.setCheckable(True)
+        self.connect_button.toggled.connect(self.on_connect_toggled)
+        clear_button = QPushButton("Clear")
+        clear_button.clicked.connect(self.canvas.clear)
+        self.status_label = QLabel("Not connected")
+        self.latency_label = QLabel("Lag: –")
+        self.latency_label.setStyleSheet("font-weight: bold;")
+
+        controls.addWidget(self.connect_button)
+        controls.addWidget(clear_button)
+        controls.addWidget(self.status_label)
+        controls.addStretch(1)
+        controls.addWidget(self.latency_label)
+        main_layout.addLayout(controls)
+
+    def on_connect_toggled(self, checked):
+        if checked:
+            self.streamer = StrokeStreamer(self)
+            self.streamer.status.connect(self.status_label.setText)
+            self.streamer.latency.connect(self.on_latency)
+            self.streamer.pen_moved.connect(self.canvas.set_pen)
+            self.streamer.finished.connect(self.on_streamer_finished)
+            self.streamer.start()
+            self.connect_button.setText("Disconnect robot")
+        elif self.streamer is not None:
+            # returns at once, a streamer still waiting for the bridge stops when the accept times out
+            self.streamer.requestInterruption()
+
+    def on_stroke_points(self, points, timestamp):
+        if self.streamer is not None:
+            self.streamer.put(points, timestamp)
+
+    def on_latency(self, milliseconds, millimeters):
+        self.latency_label.setText(f"Lag: {milliseconds:.0f} ms · {millimeters:.1f} mm")
+
+    def on_streamer_finished(self):
+        self.streamer = None
+        self.connect_button.blockSignals(True)
+        self.connect_button.setChecked(False)
+        self.connect_button.blockSignals(False)
+        self.connect_button.setText("Connect robot")
+
+    def shutdown(self):
+        # called by MainWindow on exit, closeEvent only reaches the widget when it runs on its own
+        if self.streamer is not None:
+            self.streamer.requestInterruption()
+            self.streamer.wait(2000)
+
+    def closeEvent(self, event):
+        self.shutdown()
+        super().closeEvent(event)
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    window = FreehandTab()
+    window.show()
+    sys.exit(app.exec())
@@ -11,6 +11,7 @@ from circuit_tab import CircuitTab
 from Mensch_Robo import MenschRoboTab
 from rotation_matrixes import RotationMatrixWidget
 from drawing_tab import ShapeSelector
+from freehand_tab import FreehandTab
 
 
 def get_stylesheet() -> str:
@@ -98,7 +99,7 @@ class MainWindow(QWidget):
         title = QLabel("Drawing Bot – Workshop Suite")
         title.setObjectName("HeaderTitle")
 
-        subtitle = QLabel("Robotics • Rotation Matrices • Circuits • Drawing")
+        subtitle = QLabel("Robotics • Rotation Matrices • Circuits • Drawing • Freehand")
         subtitle.setObjectName("HeaderSubtitle")
         subtitle.setProperty("variant", "muted")
 
@@ -126,13 +127,22 @@ class MainWindow(QWidget):
         self.tabs.addTab(CircuitTab(), "Schaltung")
         self.rotation_tab = RotationMatrixWidget()
         self.tabs.insertTab(2, self.rotation_tab, "Rotation Matrix")
-        self.tabs.addTab(ShapeSelector(), "Drawing Tab")
+        self.drawing_tab = ShapeSelector()
+        self.tabs.addTab(self.drawing_tab, "Drawing Tab")
+        self.freehand_tab = FreehandTab()
+        self.tabs.addTab(self.freehand_tab, "Freehand")
         self.tabs.addTab(QWidget(), "Settings")
 
         # ---------- Compose ----------
         root.addWidget(header)
         root.addWidget(self.tabs)
 
+    def closeEvent(self, event):
+        # stop the robot threads of the tabs, their own closeEvent is not called for tab pages
+        self.drawing_tab.shutdown()
+        self.freehand_tab.shutdown()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
     # High-DPI friendly text rendering (optional)
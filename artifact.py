@@ -0,0 +1,111 @@
+import mmap
+import struct
+import hashlib
+import numpy as np
+from drawing_bot_api import delta_utils
+from drawing_bot_api.config import *
+from drawing_bot_api.encoding import Encoded_trajectory, encode_angles
+
+ARTIFACT_VERSION = 1
+
+# Compiled trajectory, written by DrawingBot.compile() and sent again by DrawingBot.replay() without sampling,
+# IK or formatting. Little endian, one file:
+#   header   _HEADER padded to _HEADER_SIZE bytes
+#   frames:  int64 offsets (count + 1) followed by the message bytes, message i is data[offsets[i]:offsets[i + 1]]
+#   angles:  float32 joint angles (count, 2), encoded on load with encode_angles (vectorized, once per replay)
+# The header holds the settings the trajectory was compiled with. A trajectory compiled for another geometry
+# (l1, l2, d, GEAR_RATIO) is refused, one compiled with another SERIAL_DELAY is replayed with its own period.
+_MAGIC = b'DBOTTRAJ'
+_HEADER = struct.Struct('<8sHBBddddh16sQQ') # magic, version, kind, flags, unit, speed, serial delay, gear ratio, decimals, geometry hash, count, data size
+_HEADER_SIZE = 128
+KIND_FRAMES, KIND_ANGLES = 0, 1
+_FLAG_PAIRED, _FLAG_DEDUP = 1, 2
+
+def geometry_hash(geometry=None):
+    _key = repr((*delta_utils.lengths(geometry), GEAR_RATIO))
+    return hashlib.sha1(_key.encode('utf-8')).hexdigest()[:16]
+
+class Trajectory_artifact:
+    def __init__(self, kind, unit, speed, serial_delay, decimals, paired, dedup, geometry, messages=None, angles=None):
+        # messages: Encoded_trajectory (or a list of str / bytes messages) for KIND_FRAMES
+        # angles: (N, 2) joint angles for KIND_ANGLES
+        # decimals: encoding decimals, None for the full float repr
+        self.kind = kind
+        self.unit = unit
+        self.speed = speed
+        self.serial_delay = serial_delay
+        self.decimals = decimals
+        self.paired = paired
+        self.dedup = dedup
+        self.geometry = geometry
+        self._messages = messages
+        self.angles = angles
+
+    def messages(self):
+        # Encoded_trajectory of the messages, one pacing slot each
+        if self.kind == KIND_FRAMES:
+            return self._messages
+        _encoded = encode_angles(self.angles, self.decimals)
+        return _encoded.paired() if self.paired else _encoded
+
+    def messages_per_point(self):
+        return 1 if self.paired else 2
+
+    def __len__(self):
+        return len(self._messages) if self.kind == KIND_FRAMES else len(self.angles) * self.messages_per_point()
+
+    def write(self, path):
+        _flags = (_FLAG_PAIRED if self.paired else 0) | (_FLAG_DEDUP if self.dedup else 0)
+        if self.kind == KIND_FRAMES:
+            _data, _offsets = _frames(self._messages)
+            _count, _payload = len(_offsets) - 1, [_offsets.astype('<i8').tobytes(), _data]
+        else:
+            _angles = np.ascontiguousarray(self.angles, dtype='<f4').reshape(-1, 2)
+            _count, _payload = len(_angles), [_angles.tobytes()]
+        _data_size = sum(len(_part) for _part in _payload)
+        _header = _HEADER.pack(_MAGIC, ARTIFACT_VERSION, self.kind, _flags, self.unit, self.speed, self.serial_delay,
+                               GEAR_RATIO, -1 if self.decimals is None else self.decimals, self.geometry.encode('ascii'),
+                               _count, _data_size)
+        with open(path, 'wb') as _file:
+            _file.write(_header.ljust(_HEADER_SIZE, b'\0'))
+            for _part in _payload:
+                _file.write(_part)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        # memory-maps the file, messages are zero-copy views into the mapping
+        with open(path, 'rb') as _file:
+            _map = mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(_map) < _HEADER_SIZE:
+            raise ValueError(f'{path} is not a trajectory artifact.')
+        (_magic, _version, _kind, _flags, _unit, _speed, _serial_delay, _gear_ratio, _decimals, _geometry,
+         _count, _data_size) = _HEADER.unpack_from(_map)
+        if _magic != _MAGIC:
+            raise ValueError(f'{path} is not a trajectory artifact.')
+        if _version != ARTIFACT_VERSION:
+            raise ValueError(f'{path} has artifact version {_version}, this API reads version {ARTIFACT_VERSION}. Compile it again.')
+        if len(_map) < _HEADER_SIZE + _data_size:
+            raise ValueError(f'{path} is truncated.')
+
+        _artifact = cls(_kind, _unit, _speed, _serial_delay, None if _decimals < 0 else _decimals,
+                        bool(_flags & _FLAG_PAIRED), bool(_flags & _FLAG_DEDUP), _geometry.rstrip(b'\0').decode('ascii'))
+        if _kind == KIND_FRAMES:
+            _offsets = np.frombuffer(_map, dtype='<i8', count=_count + 1, offset=_HEADER_SIZE)
+            _start = _HEADER_SIZE + _offsets.nbytes
+            _artifact._messages = Encoded_trajectory(memoryview(_map)[_start:_HEADER_SIZE + _data_size], _offsets)
+        elif _kind == KIND_ANGLES:
+            _artifact.angles = np.frombuffer(_map, dtype='<f4', count=2 * _count, offset=_HEADER_SIZE).reshape(-1, 2)
+        else:
+            raise ValueError(f'{path} has an unknown artifact kind {_kind}.')
+        return _artifact
+
+def _frames(messages):
+    # (data, offsets) of messages as they are stored in the file
+    if isinstance(messages, Encoded_trajectory):
+        return bytes(messages.data), np.asarray(messages.offsets)
+    _encoded = [message if isinstance(message, (bytes, bytearray, memoryview)) else str(message).encode('utf-8')
+                for message in messages]
+    _offsets = np.zeros(len(_encoded) + 1, dtype=np.int64)
+    np.cumsum([len(_message) for _message in _encoded], out=_offsets[1:])
+    return b''.join(_encoded), _offsets
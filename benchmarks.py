@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# Benchmarks of the drawing bot stack that run without the robot.
+# python -m drawing_bot_api.benchmarks <name>
+import sys
+import time
+import asyncio
+import resource
+import subprocess
+import multiprocessing
+import numpy as np
+from drawing_bot_api.config import *
+from drawing_bot_api.transport import make_transport
+from drawing_bot_api.virtual_robot import Virtual_robot
+
+#################################
+# Transports
+#################################
+
+def _echo_peer(transport_name, messages):
+    # bridge side of the transport benchmark, sends every frame straight back
+    async def _run():
+        reader, writer = await make_transport(transport_name).open_bridge_connection()
+        _received = 0
+        while _received < messages:
+            data = await reader.read(65536)
+            if not data:
+                break
+            _received += data.count(b'\n')
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+    asyncio.run(_run())
+
+def benchmark_transport(transport_name, messages=20000, frame=b'W12.345\nE-1.234\n'):
+    # round trip latency of one paired frame and CPU time per message of both processes
+    transport = make_transport(transport_name)
+    server = transport.listen(timeout=20)
+    peer = multiprocessing.Process(target=_echo_peer, args=(transport_name, messages * frame.count(b'\n')))
+    _cpu_before = resource.getrusage(resource.RUSAGE_SELF)
+    peer.start()
+    conn, _ = server.accept()
+
+    _latencies = np.empty(messages)
+    for _index in range(messages):
+        _start = time.perf_counter()
+        conn.sendall(frame)
+        _received = 0
+        while _received < len(frame):
+            _received += len(conn.recv(65536))
+        _latencies[_index] = time.perf_counter() - _start
+
+    conn.close()
+    peer.join()
+    server.close()
+    _cpu_after = resource.getrusage(resource.RUSAGE_SELF)
+    _children = resource.getrusage(resource.RUSAGE_CHILDREN) # includes the peer after join
+    _cpu = (_cpu_after.ru_utime + _cpu_after.ru_stime - _cpu_before.ru_utime - _cpu_before.ru_stime
+            + _children.ru_utime + _children.ru_stime)
+    return {
+        'transport': str(transport),
+        'messages': messages,
+        'median_rtt_us': float(np.median(_latencies) * 1e6),
+        'p99_rtt_us': float(np.percentile(_latencies, 99) * 1e6),
+        'cpu_us_per_message': _cpu / messages * 1e6,
+    }
+
+def transports():
+    for _name in ('tcp', 'unix', 'shm'):
+        # one process per transport, so RUSAGE_CHILDREN only counts this transports peer
+        _context = multiprocessing.get_context('fork')
+        _queue = _context.Queue()
+        _process = _context.Process(target=lambda queue, name: queue.put(benchmark_transport(name)), args=(_queue, _name))
+        _process.start()
+        result = _queue.get()
+        _process.join()
+        print(f'{result["transport"]:<28} median RTT {result["median_rtt_us"]:8.1f} us   p99 {result["p99_rtt_us"]:8.1f} us   '
+              f'CPU {result["cpu_us_per_message"]:6.1f} us/msg')
+
+#################################
+# End to end on the virtual robot
+#################################
+
+def start_bridge(port, transport=TRANSPORT):
+    # serial_com.py as its own process, like on the workshop machines
+    return subprocess.Popen([sys.executable, '-m', 'drawing_bot_api.serial_com.serial_com', transport, '--port', port],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+def end_to_end(speeds=(100, 200, 400, 800), transport=TRANSPORT):
+    # drawing throughput through API, bridge and pty at the configured baud rate
+    from drawing_bot_api import DrawingBot, shapes
+
+    with Virtual_robot() as robot:
+        bridge = start_bridge(robot.port, transport)
+        try:
+            bot = DrawingBot(verbose=0, paired_frames=True)
+            with bot.session():
+                for speed in speeds:
+                    bot.speed = speed
+                    bot.add_shape(shapes.Circle([0, 110], 30))
+                    bot.add_shape(shapes.Line([30, 110], [-30, 80]))
+                    robot.reset_stats()
+                    _start = time.monotonic()
+                    bot.execute(promting=False)
+                    _wall = time.monotonic() - _start
+                    time.sleep(0.2) # let the bridge and the pty drain
+                    _stats = robot.stats()
+                    _report = bot._serial_handler.scheduler.report()
+                    print(f'speed {speed:4d}: {_stats["motion_commands"]:5d} commands, {_stats["commands_per_second"]:6.0f} cmd/s at the robot, '
+                          f'planned {_report["planned_duration"]:.2f} s, sent in {_report["duration"]:.2f} s, '
+                          f'received in {_stats["duration"]:.2f} s, execute took {_wall:.2f} s')
+        finally:
+            bridge.terminate()
+            bridge.wait()
+
+#################################
+# Several robots at once
+#################################
+
+def fleet(sizes=(1, 2, 4), speed=400, transport=TRANSPORT):
+    # aggregate drawing throughput of 1..n virtual robots drawing at the same time, one bridge and one
+    # independently paced Serial_handler per robot, all bots driven from this process by execute_all
+    import tempfile
+    from drawing_bot_api import DrawingBot, shapes
+    from drawing_bot_api.devices import Device_registry, execute_all
+    from drawing_bot_api.supervisor import ensure_bridge_running, stop_bridge
+
+    with tempfile.TemporaryDirectory() as _directory:
+        registry = Device_registry(path=f'{_directory}/devices.json')
+        for size in sizes:
+            robots = [Virtual_robot().start() for _ in range(size)]
+            devices = [registry.add(f'bench{_index}', serial_port=robot.port, transport=transport) for _index, robot in enumerate(robots)]
+            try:
+                for device in devices:
+                    ensure_bridge_running(device=device)
+                bots = []
+                for device in devices:
+                    bot = DrawingBot(verbose=0, speed=speed, paired_frames=True, device=device)
+                    bot.add_shape(shapes.Circle([0, 110], 30))
+                    bot.add_shape(shapes.Line([30, 110], [-30, 80]))
+                    bots.append(bot)
+                for robot in robots:
+                    robot.reset_stats()
+
+                _start = time.monotonic()
+                _results = execute_all(bots)
+                _wall = time.monotonic() - _start
+                time.sleep(0.2) # let the bridges and the ptys drain
+                _commands = sum(robot.stats()['motion_commands'] for robot in robots)
+                _per_robot = [robot.stats()['commands_per_second'] for robot in robots]
+                _errors = [_result for _result in _results if isinstance(_result, Exception)]
+                print(f'{size} robots: {_commands:6d} commands in {_wall:.2f} s, {_commands / _wall:7.0f} cmd/s aggregate, '
+                      f'{min(_per_robot):5.0f}-{max(_per_robot):5.0f} cmd/s per robot' + (f', {len(_errors)} failed: {_errors[0]}' if _errors else ''))
+            finally:
+                for device in devices:
+                    stop_bridge(device=device)
+                for robot in robots:
+                    robot.stop()
+
+#################################
+# Stop latency
+#################################
+
+def stop_latency(windows=(IN_FLIGHT_WINDOW, None), speed=50, period=0.001, after=0.5, transport=TRANSPORT):
+    # Time from abort() / pause() until the virtual robot received its last command, and the commands it received
+    # after the call, with and without the in-flight window of Serial_handler.
+    # period: pacing slot, shorter than the UART time of a message (about 1.4 ms for a paired frame at 115200 baud)
+    #         fills the queues of the bridge and the serial driver, None for SERIAL_DELAY
+    import threading
+    from drawing_bot_api import DrawingBot, shapes
+
+    def _run(bot, robot, action):
+        bot.add_shape(shapes.Circle([0, 110], 30))
+        bot.add_shape(shapes.Circle([0, 110], 20))
+        _thread = threading.Thread(target=bot.execute, kwargs={'promting': False}, daemon=True)
+        _thread.start()
+        time.sleep(after)
+        with robot.lock:
+            _before = robot.commands['W'] + robot.commands['E']
+        _stopped = time.monotonic()
+        action()
+        time.sleep(1) # everything that still arrives is a late command
+        with robot.lock:
+            _late = [_time for _time, _side, _value in robot.targets if _time > _stopped]
+            _after = robot.commands['W'] + robot.commands['E'] - _before
+        return _thread, (max(_late) - _stopped if _late else 0.0), _after
+
+    with Virtual_robot() as robot:
+        bridge = start_bridge(robot.port, transport)
+        try:
+            bot = DrawingBot(verbose=0, speed=speed, paired_frames=True)
+            with bot.session():
+                bot.move_to_point([0, 110]) # waits for the bridge, the runs start with a connected board
+                if period is not None:
+                    bot._serial_handler.period = period
+                for window in windows:
+                    bot._serial_handler.window = window
+                    _thread, _abort_latency, _abort_commands = _run(bot, robot, bot.abort)
+                    _thread.join()
+                    _thread, _pause_latency, _pause_commands = _run(bot, robot, bot.pause)
+                    bot.abort()
+                    _thread.join()
+                    print(f'window {str(window):>4}: abort {_abort_latency * 1000:7.1f} ms ({_abort_commands:4d} commands), '
+                          f'pause {_pause_latency * 1000:7.1f} ms ({_pause_commands:4d} commands) until the last command')
+        finally:
+            bridge.terminate()
+            bridge.wait()
+
+#################################
+# Jog latency
+#################################
+
+def jog(duration=2.0, rate=500, radius=20, transport=TRANSPORT):
+    # Targets on a circle at rate per second through DrawingBot.jog(), latency from move() until the virtual robot
+    # received the target. Most targets are replaced by a newer one before they are sent (JOG_PERIOD).
+    from drawing_bot_api import DrawingBot
+    from drawing_bot_api.serial_handler import _targets
+
+    with Virtual_robot() as robot:
+        bridge = start_bridge(robot.port, transport)
+        try:
+            bot = DrawingBot(verbose=0)
+            with bot.jog() as _jog:
+                _start = time.monotonic()
+                _moves = 0
+                while time.monotonic() - _start < duration:
+                    _angle = 2 * np.pi * (time.monotonic() - _start) / duration
+                    _jog.move([radius * np.cos(_angle), 95 + radius * np.sin(_angle)])
+                    _moves += 1
+                    time.sleep(1 / rate)
+                time.sleep(0.2) # let the last target arrive
+                _stats = _jog.latency()
+
+            with robot.lock:
+                _received = [(_time, _value) for _time, _side, _value in robot.targets if _side == 'W']
+            _latencies = []
+            _position = 0
+            for _requested, _sent, message in _jog.sent: # robot targets arrive in the order they were sent
+                _value = _targets([message])['W']
+                while _position < len(_received) and (_received[_position][0] < _sent or _received[_position][1] != _value):
+                    _position += 1
+                if _position < len(_received):
+                    _latencies.append(_received[_position][0] - _requested)
+            _latencies = np.array(_latencies) * 1000
+            print(f'{_moves} moves, {_stats["sent"]} sent, {_stats["dropped"]} replaced, {len(_latencies)} received')
+            print(f'move() to send:  median {_stats["median"] * 1000:5.1f} ms, p95 {_stats["p95"] * 1000:5.1f} ms, max {_stats["max"] * 1000:5.1f} ms')
+            print(f'move() to robot: median {np.median(_latencies):5.1f} ms, p95 {np.percentile(_latencies, 95):5.1f} ms, max {_latencies.max():5.1f} ms')
+        finally:
+            bridge.terminate()
+            bridge.wait()
+
+DISPATCH = {
+    'transports': transports,
+    'end_to_end': end_to_end,
+    'fleet': fleet,
+    'stop_latency': stop_latency,
+    'jog': jog,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in DISPATCH:
+        print(f'Usage: python -m drawing_bot_api.benchmarks <{"|".join(DISPATCH)}>')
+        sys.exit(1)
+    DISPATCH[sys.argv[1]]()
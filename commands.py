@@ -1,10 +1,18 @@
 from drawing_bot_api.delta_utils import plt
-from drawing_bot_api.delta_utils import ik_delta
+from drawing_bot_api.delta_utils import ik_delta, ik_delta_batch
 import time
+from functools import partial
+from contextlib import contextmanager
 from drawing_bot_api.logger import Log, Error_handler, ErrorCode
 from drawing_bot_api import shapes
 from drawing_bot_api.config import *
 from drawing_bot_api.serial_handler import Serial_handler
+from drawing_bot_api.preflight import preflight, Preflight_error
+from drawing_bot_api.encoding import encode_angles, encoder_decimals, dedup_mask
+from drawing_bot_api.artifact import Trajectory_artifact, KIND_FRAMES, KIND_ANGLES, geometry_hash
+from drawing_bot_api.devices import get_device
+from drawing_bot_api.telemetry import Telemetry_client
+from drawing_bot_api.jog import Jog
 import numpy as np
 import matplotlib as mpl
 from matplotlib.backends.backend_agg import FigureCanvasAgg
@@ -12,9 +20,16 @@ mpl.get_backend()
 mpl.use('Agg')
 
 class DrawingBot:
-    def __init__(self, baud=115200, verbose=2, unit='mm', speed=200):
+    def __init__(self, baud=115200, verbose=2, unit='mm', speed=200, compact_encoding=True, dedup=False, paired_frames=False, device=None):
         # unit: Define which unit the user is using
         # speed is measured in unit/s
+        # compact_encoding: send angles with a fixed number of decimals matched to the encoder resolution (encoding.py)
+        #                   instead of the full float repr
+        # dedup: skip motor commands that change less than DEDUP_THRESHOLD, needs compact_encoding
+        # paired_frames: send the W and E command of a point as one write with one pacing slot per point
+        #                (otherwise every command gets its own slot)
+        # device: name of a robot in the device registry (devices.py) or a Device, sets the transport to its bridge
+        #         and its geometry, None is the robot configured in config.py
 
         self.log = Log((verbose-1)>0)
         self.error_handler = Error_handler(verbose)
@@ -24,6 +39,16 @@ class DrawingBot:
         self.speed = speed
         self.unit = 1000
         self.shapes = []
+        self.device = get_device(device)
+        self.geometry = self.device.geometry # (l1, l2, d) or None for the constants of delta_utils
+        self.ik_solver = ik_delta_batch if self.geometry is None else partial(ik_delta_batch, geometry=self.geometry)
+        self._serial_handler = None # set while a session() is open
+        self._active_handler = None # Serial_handler of the last send, target of pause(), resume() and abort()
+        self.progress = None # called with the index of every message execute() or replay() sent (from the sending thread)
+        self.encoding_decimals = encoder_decimals() if compact_encoding else None
+        self.bandwidth = None # link usage of the last trajectory, see Encoded_trajectory.bandwidth()
+        self.dedup = dedup and compact_encoding
+        self.paired_frames = paired_frames
         
         if unit == 'm' or unit == 'meter':
             self.unit = 1
@@ -41,16 +66,17 @@ class DrawingBot:
         x=position[0]/self.unit
         y=position[1]/self.unit
 
-        try:
-            angles = ik_delta([x, y])
-            return angles
-        except:
+        angles, reachable = ik_delta_batch([x, y], geometry=self.geometry)
+        if not reachable[0]:
             self.error_handler("Targeted position is outside of robots domain.", ErrorCode.DOMAIN_ERROR)
-            exit()
+            raise Preflight_error(preflight(position, unit=self.unit, ik_solver=self.ik_solver))
+        return angles[0]
+
+    def _format_angle(self, angle, side):
+        return f'{side}{GEAR_RATIO*float(angle)}\n'
 
     def send_angle(self, angle, side, serial_handler):
-        message = f'{side}{3*float(angle)}\n'
-        serial_handler(message)
+        serial_handler(self._format_angle(angle, side))
 
     # OLD AND UNUSED #########
     def update_position(self, position, serial_handler):
@@ -64,10 +90,49 @@ class DrawingBot:
     def add_position(self, position, serial_handler):
         angles = self.get_angles(position)
         self.log(f'Position: {position}, Angles: {angles}', clear=False)
-        self.send_angle(angles[0], 'W', serial_handler)
-        self.send_angle(angles[1], 'E', serial_handler)
+        if self.paired_frames: # one message, the handler sends it as the whole head without settling
+            serial_handler(self._format_angle(angles[0], 'W') + self._format_angle(angles[1], 'E'))
+        else:
+            self.send_angle(angles[0], 'W', serial_handler)
+            self.send_angle(angles[1], 'E', serial_handler)
         #time.sleep(SERIAL_DELAY)
 
+    def add_positions(self, positions, serial_handler):
+        # batched add_position, solves IK for the whole trajectory at once
+        _angles, _reachable = self.ik_solver(positions, self.unit)
+        if not _reachable.all():
+            self.error_handler("Targeted position is outside of robots domain.", ErrorCode.DOMAIN_ERROR)
+            raise Preflight_error(preflight(positions, unit=self.unit, ik_solver=self.ik_solver))
+
+        if self.log.verbose_level:
+            for position, angles in zip(positions, _angles):
+                self.log(f'Position: {position}, Angles: {angles}', clear=False)
+
+        if self.encoding_decimals is None:
+            for angles in _angles:
+                if self.paired_frames:
+                    serial_handler(self._format_angle(angles[0], 'W') + self._format_angle(angles[1], 'E'))
+                else:
+                    self.send_angle(angles[0], 'W', serial_handler)
+                    self.send_angle(angles[1], 'E', serial_handler)
+        else:
+            _encoded = self._encode(_angles)
+            self._check_bandwidth(_encoded)
+            serial_handler.extend(_encoded)
+
+    def _encode(self, angles):
+        _send_mask = dedup_mask(angles, DEDUP_THRESHOLD) if self.dedup else None
+        _encoded = encode_angles(angles, self.encoding_decimals, send_mask=_send_mask)
+        return _encoded.paired() if self.paired_frames else _encoded
+
+    def _check_bandwidth(self, encoded):
+        self.bandwidth = encoded.bandwidth()
+        self.log(f'Link usage: {self.bandwidth["bytes_per_second"]:.0f} B/s ({100*self.bandwidth["link_utilisation"]:.1f}% of {BAUD} baud)')
+        if self.dedup:
+            self.log(f'Dedup saved {self.bandwidth["saved_bytes"]} B ({100*self.bandwidth["saved_fraction"]:.1f}%)')
+        if self.bandwidth['link_utilisation'] > 1:
+            self.error_handler(f'Trajectory needs {self.bandwidth["bytes_per_second"]:.0f} B/s, more than the serial link can carry. Reduce the speed or increase SERIAL_DELAY.', warning=True)
+
 
     def add_shape(self, shape):
         self.shapes.append(shape)
@@ -225,9 +290,54 @@ class DrawingBot:
         
         plt.show()
 
+    @contextmanager
+    def session(self):
+        # Keeps one listening socket and one bridge connection open for every execute() and move_to_point()
+        # inside the with block, the connection is re-established automatically if the bridge drops it.
+        # with drawing_bot.session():
+        #     drawing_bot.execute()
+        if self._serial_handler is not None:
+            yield self
+            return
+
+        self._serial_handler = Serial_handler(persistent=True, transport=self.device.make_transport(), health_port=self.device.health_port)
+        try:
+            yield self
+        finally:
+            self._serial_handler.close()
+            self._serial_handler = None
+
+    def _get_serial_handler(self):
+        _serial_handler = self._serial_handler if self._serial_handler is not None else Serial_handler(transport=self.device.make_transport(), health_port=self.device.health_port)
+        _serial_handler.messages_per_point = self._messages_per_point()
+        _serial_handler.progress = self.progress
+        self._active_handler = _serial_handler
+        return _serial_handler
+
+    # Control of a running execute() or replay() from another thread (e.g. a GUI button or a signal handler).
+    # The motors stop within IN_FLIGHT_WINDOW pacing slots: pause() holds the last target in flight,
+    # abort() also drops what the bridge has not written to the UART yet and execute() returns 1.
+    def pause(self):
+        if self._active_handler is not None:
+            self._active_handler.pause()
+
+    def resume(self):
+        if self._active_handler is not None:
+            self._active_handler.resume()
+
+    def abort(self):
+        # returns False if nothing was running
+        return self._active_handler is not None and self._active_handler.abort()
+
+    def _messages_per_point(self):
+        return 1 if self.paired_frames else 2
+
     def move_to_point(self, point, promt_after=False):
-        serial_handler = Serial_handler()
-        self.add_position(point, serial_handler=serial_handler)
+        # raises Preflight_error for an unreachable point, before a handler listens for the bridge
+        _messages = _Message_collector()
+        self.add_position(point, serial_handler=_messages)
+        serial_handler = self._get_serial_handler()
+        serial_handler.extend(_messages)
         serial_handler.send_buffer(False)
 
         if promt_after:
@@ -235,46 +345,190 @@ class DrawingBot:
             if answer:
                 return 0
 
-    def _get_points(self, shape):
+    def _get_number_of_points(self, shape):
         __duration = (shape.circumference / self.speed) # in seconds
-        __number_of_points = int(__duration / SERIAL_DELAY)
-        _points = []
+        return int(__duration / SERIAL_DELAY)
 
-        for i in range(__number_of_points):
-            _points.append(shape.get_point(i * (1/__number_of_points)))
-
-        return _points
+    def _get_points(self, shape):
+        __number_of_points = self._get_number_of_points(shape)
+        return shape.get_points(np.arange(__number_of_points) * (1/max(__number_of_points, 1)))
     
-    def _get_all_points(self):
-        _points = []
-        for shape in self.shapes:
-            _points.extend(self._get_points(shape))
-        return _points
+    def _get_all_points(self, with_shape_index=False):
+        # one contiguous (N, 2) trajectory for all shapes
+        # with_shape_index: also return the index of the shape every point belongs to
+        if not self.shapes:
+            return (np.empty((0, 2)), np.empty(0, dtype=int)) if with_shape_index else np.empty((0, 2))
+        _points = [self._get_points(shape) for shape in self.shapes]
+        if with_shape_index:
+            return np.concatenate(_points), np.repeat(np.arange(len(_points)), [len(p) for p in _points])
+        return np.concatenate(_points)
+
+    def _get_trajectory(self, points=None):
+        # points sent by execute (including the last point) and the shape index of every point (-1 for user defined points)
+        if points is None:
+            _points, _shape_index = self._get_all_points(with_shape_index=True)
+        else:
+            _points = np.asarray(points, dtype=float).reshape(-1, 2)
+            _shape_index = np.full(len(_points), -1)
+        _points = np.concatenate([_points, [self.shapes[-1].get_point(1)]]) # Add last point
+        _shape_index = np.append(_shape_index, len(self.shapes) - 1)
+        return _points, _shape_index
+
+    def command_stream(self, points=None):
+        # messages execute() would send, one pacing slot each, without connecting to the robot
+        if not self.shapes:
+            raise ValueError('List of shapes empty. Use drawing_bot.add_shape() to add shapes for the robot to draw!')
+        _points, _shape_index = self._get_trajectory(points)
+        _report = preflight(_points, _shape_index, self.unit, self.ik_solver)
+        if not _report:
+            self.error_handler(str(_report), ErrorCode.DOMAIN_ERROR)
+            return []
+        _collector = _Message_collector()
+        self.add_positions(_points, serial_handler=_collector)
+        return _collector
+
+    def preflight(self, points=None):
+        # checks the whole trajectory against reachability, the domain and the joint limits without connecting to the robot
+        if not self.shapes:
+            self.error_handler('List of shapes empty. Use drawing_bot.add_shape() to add shapes for the robot to draw!', ErrorCode.NO_SHAPES_ERROR)
+            return None
+        _points, _shape_index = self._get_trajectory(points)
+        return preflight(_points, _shape_index, self.unit, self.ik_solver)
+
+    def _iter_point_chunks(self, shapes_, points=None, chunk_size=STREAM_CHUNK_SIZE):
+        # lazily sampled trajectory, yields (points, shape_index) chunks of at most chunk_size points
+        if points is not None:
+            _points = np.asarray(points, dtype=float).reshape(-1, 2)
+            for _start in range(0, len(_points), chunk_size):
+                _chunk = _points[_start:_start + chunk_size]
+                yield _chunk, np.full(len(_chunk), -1)
+        else:
+            for _index, shape in enumerate(shapes_):
+                __number_of_points = self._get_number_of_points(shape)
+                for _start in range(0, __number_of_points, chunk_size):
+                    _t = np.arange(_start, min(_start + chunk_size, __number_of_points)) * (1/__number_of_points)
+                    yield shape.get_points(_t), np.full(len(_t), _index)
+
+        yield np.array([shapes_[-1].get_point(1)], dtype=float), np.array([len(shapes_) - 1]) # Add last point
+
+    def _iter_angle_chunks(self, point_chunks):
+        # IK and preflight per chunk, raises Preflight_error at the first chunk that fails
+        _offset = 0
+        for _points, _shape_index in point_chunks:
+            _report = preflight(_points, _shape_index, self.unit, self.ik_solver, index_offset=_offset)
+            if not _report:
+                self.error_handler(str(_report), ErrorCode.DOMAIN_ERROR)
+                raise Preflight_error(_report)
+            _offset += len(_points)
+            yield _points, _report.angles
+
+    def _iter_messages(self, angle_chunks):
+        for _points, _angles in angle_chunks:
+            if self.log.verbose_level:
+                for position, angles in zip(_points, _angles):
+                    self.log(f'Position: {position}, Angles: {angles}', clear=False)
+
+            if self.encoding_decimals is None:
+                for angles in _angles:
+                    if self.paired_frames:
+                        yield self._format_angle(angles[0], 'W') + self._format_angle(angles[1], 'E')
+                    else:
+                        yield self._format_angle(angles[0], 'W')
+                        yield self._format_angle(angles[1], 'E')
+            else:
+                yield from self._encode(_angles)
 
-    def execute(self, promting=True, clear_buffer=True, points=None): # time defines how long the drawing process should take
+    def execute(self, promting=True, clear_buffer=True, points=None, streaming=False): # time defines how long the drawing process should take
+        # streaming: sample, solve and encode in chunks while sending instead of building the whole buffer first,
+        #            the trajectory is then checked chunk by chunk and the drawing stops at the first invalid chunk
 
         if not self.shapes:
             self.error_handler('List of shapes empty. Use drawing_bot.add_shape() to add shapes for the robot to draw!', ErrorCode.NO_SHAPES_ERROR)
             return 1
-        
-        serial_handler = Serial_handler()
-
-        _points = points
-
-        if _points is None:
-            _points = self._get_all_points()
 
-        for point in _points:
-            self.add_position(point, serial_handler=serial_handler)
+        if streaming:
+            _messages = self._iter_messages(self._iter_angle_chunks(self._iter_point_chunks(list(self.shapes), points)))
+            if clear_buffer:
+                self.shapes.clear()
+            try:
+                return self._get_serial_handler().send_stream(_messages, promting)
+            except Preflight_error: # the chunks before the failing one were drawn
+                return 1
+        
+        _points, _shape_index = self._get_trajectory(points)
+        _report = preflight(_points, _shape_index, self.unit, self.ik_solver)
+        if not _report:
+            self.error_handler(str(_report), ErrorCode.DOMAIN_ERROR)
+            return 1
 
-        self.add_position(self.shapes[-1].get_point(1), serial_handler=serial_handler) # Add last point 
+        serial_handler = self._get_serial_handler()
+        self.add_positions(_points, serial_handler=serial_handler)
 
         if clear_buffer:
             self.shapes.clear()
         
-        serial_handler.send_buffer(promting)
+        return serial_handler.send_buffer(promting)
         #plt.show()
 
+    def compile(self, path, points=None, store_angles=False):
+        # Writes the trajectory execute() would send to a binary artifact (artifact.py), replay(path) sends it again
+        # without sampling, IK or encoding. The shapes are kept.
+        # store_angles: store float32 joint angles instead of the encoded messages, they are encoded on every replay
+        #               (without dedup), so the artifact also works with another encoding
+        if not self.shapes:
+            self.error_handler('List of shapes empty. Use drawing_bot.add_shape() to add shapes for the robot to draw!', ErrorCode.NO_SHAPES_ERROR)
+            return None
+
+        _settings = dict(unit=self.unit, speed=self.speed, serial_delay=SERIAL_DELAY, paired=self.paired_frames, geometry=geometry_hash(self.geometry))
+        if store_angles:
+            _report = self.preflight(points)
+            if not _report:
+                self.error_handler(str(_report), ErrorCode.DOMAIN_ERROR)
+                return None
+            _artifact = Trajectory_artifact(KIND_ANGLES, decimals=self.encoding_decimals if self.encoding_decimals is not None else encoder_decimals(),
+                                            dedup=False, angles=_report.angles, **_settings)
+        else:
+            _messages = self.command_stream(points)
+            if not _messages:
+                return None
+            _artifact = Trajectory_artifact(KIND_FRAMES, decimals=self.encoding_decimals, dedup=self.dedup, messages=_messages, **_settings)
+
+        _artifact.write(path)
+        self.log(f'Compiled {len(_artifact)} messages to {path}.')
+        return path
+
+    def replay(self, path, promting=True):
+        # sends a compiled artifact, the messages are streamed from the memory-mapped file with the pacing it was compiled for
+        try:
+            _artifact = Trajectory_artifact.load(path)
+        except (OSError, ValueError) as e:
+            self.error_handler(f'Cannot replay {path}: {e}', ErrorCode.ARTIFACT_ERROR)
+            return 1
+        if _artifact.geometry != geometry_hash(self.geometry):
+            self.error_handler(f'{path} was compiled for another robot geometry or GEAR_RATIO. Compile it again.', ErrorCode.ARTIFACT_ERROR)
+            return 1
+
+        serial_handler = self._get_serial_handler()
+        serial_handler.messages_per_point = _artifact.messages_per_point()
+        serial_handler.period = _artifact.serial_delay
+        try:
+            return serial_handler.send_messages(_artifact.messages(), promting)
+        finally:
+            serial_handler.period = SERIAL_DELAY
+
+    def jog(self, period=JOG_PERIOD):
+        # Jog (jog.py) that forwards only the newest of a stream of targets, for interactive positioning:
+        # with drawing_bot.jog() as jog:
+        #     jog.move([0, 100])
+        return Jog(self, period).start()
+
+    def telemetry(self, history=0):
+        # Telemetry_client subscribed to the bridge of this bot, e.g. to compare commanded and measured angles:
+        # with drawing_bot.telemetry() as telemetry:
+        #     drawing_bot.execute(promting=False)
+        #     samples = telemetry.latest()
+        return Telemetry_client(self.device.health_port, history).start()
+
     def hard_reset(self):
         serial_handler = Serial_handler()
         serial_handler.kill_serial_script()
@@ -283,6 +537,11 @@ class DrawingBot:
     def millis(self):
         return time.time()*1000
     
+class _Message_collector(list):
+    # stands in for a Serial_handler when the messages are only needed, not sent
+    def __call__(self, message):
+        self.append(message)
+
 if __name__ == '__main__':
     drawing_bot = DrawingBot()
     drawing_bot.add_shape(shapes.Line([0, 0], [1, 5]))
@@ -1,3 +1,6 @@
+from os.path import join as _join
+from tempfile import gettempdir as _gettempdir
+
 ##### plotting settings
 
 SHAPE_COLOR = 'black'
@@ -13,10 +16,57 @@ PLOT_YLIM = [55, 175]
 
 DOMAIN_BOX = [[-70, 70], [-70, 120], [70, 120], [70, 70]] # Points: botttom left, top left, top right, bottom right
 DOMAIN_DOME = [[-70, 120], [70, 120], 80, -1] # Start point, end point, radius, direction of a partial circle
+JOINT_LIMITS = [[0.9, 4.35], [-1.2, 2.25]] # radians, [min, max] of q0 (W, left arm) and q1 (E, right arm), the domain needs about [1.01, 4.21] and [-1.07, 2.13]
 
 ##### Other settings
 
 SERIAL_DELAY = 0.005 #seconds
+PACING_CATCH_UP_BUDGET = 0.05 # seconds a drawing may fall behind its schedule before the remaining deadlines are moved back
+PACING_SPIN = 0.0005 # seconds at the end of every pacing wait that are busy-waited instead of slept
+STREAM_CHUNK_SIZE = 256 # points sampled and solved at once in streaming mode
+STREAM_QUEUE_SIZE = 4096 # max messages buffered between the producer and the paced send in streaming mode
+TRANSPORT = 'tcp' # connection between the API and the serial bridge: 'tcp', 'unix' or 'shm' (transport.py)
+SOCKET_PORT = 65432
+SOCKET_PATH = _join(_gettempdir(), 'drawing_bot.sock')
+SHM_NAME = 'drawing_bot'
+SHM_RING_SIZE = 65536 # bytes per direction
+SHM_SPIN = 0.0 # seconds a shared memory reader busy-polls before it sleeps between polls, lowers latency at the cost of CPU, only useful with a free core per process
 BAUD = 115200
 WRITE_TIMEOUT = 0.5
-USB_ID = '/dev/ttyUSB0'  #
\ No newline at end of file
+READ_TIMEOUT = 0.1 # seconds a read of the bridge waits for data from the board
+READY_TIMEOUT = 0.25 # seconds the bridge waits for the RDY reply of one readiness probe
+READY_PROBE_TIMEOUT = 0.1 # seconds, same for the first probe of a port that was ready before
+READY_RETRY_INTERVAL = 0.5 # seconds between two failed readiness probes while the board homes
+READY_CACHE_PATH = _join(_gettempdir(), 'drawing_bot_ready.json') # ports that answered RDY, shared by bridge restarts
+BRIDGE_QUEUE_SIZE = 256 # chunks buffered per direction in the bridge
+BRIDGE_MAX_WRITE = 4096 # bytes, queued commands are coalesced into UART writes of at most this size
+BRIDGE_STATS_INTERVAL = 10 # seconds between throughput reports of the bridge
+BRIDGE_ATTACH_INTERVAL = 0.05 # seconds between attempts of an idle bridge to connect to the API
+BRIDGE_IDLE_EXIT = 3600 # seconds without an API connection until a bridge exits, 0 keeps it running (supervisor.py)
+BRIDGE_LOCK_PATH = _join(_gettempdir(), 'drawing_bot_bridge.lock') # pidfile, locked by the running bridge so only one owns the serial port
+BRIDGE_HEALTH_PORT = 65433 # localhost port where the running bridge reports its state (supervisor.bridge_status)
+BRIDGE_LOG_PATH = _join(_gettempdir(), 'drawing_bot_bridge_{}.log') # output of bridges started by the supervisor, {} is the health port of the bridge
+BRIDGE_START_TIMEOUT = 15 # seconds ensure_bridge_running waits for a new bridge to report ready
+BRIDGE_SUPERVISE_INTERVAL = 2 # seconds between health checks of python supervisor.py watch
+DEVICE_REGISTRY_PATH = '~/.drawing_bot_devices.json' # robots of the station besides the default one (devices.py)
+DEVICE_PORT_BASE = 65440 # devices.py hands out socket and health ports of further robots from here on
+TELEMETRY_BUFFER_SIZE = 65536 # samples kept by the bridge and by every Telemetry_client (telemetry.py)
+TELEMETRY_QUEUE_SIZE = 256 # sample batches buffered per telemetry client in the bridge, the oldest are dropped
+MONITOR_VARIABLES = ('target', 'velocity', 'angle') # order of the SimpleFOC monitor values, matches monitor_variables of the firmware
+MONITOR_AXIS = 1 # motor of monitor lines without W/E prefix, the firmware only monitors the right motor (E)
+RESUME_HISTORY = 1024 # messages a paced send keeps to resume after a dropped bridge connection (about 5 s)
+IN_FLIGHT_WINDOW = 8 # messages a paced send may be ahead of the UART writes of the bridge, bounds the stop latency of pause() and abort()
+JOG_PERIOD = SERIAL_DELAY # seconds, minimum time between two targets of a jog, newer targets replace the waiting one
+JOG_HISTORY = 1024 # sent jog targets kept for Jog.latency()
+MOTOR_VELOCITY_LIMIT = 25 # rad/s, velocity_limit of the motors angle loop in the firmware
+FOC_P_ANGLE = 100 # P_angle.P of the firmware
+FOC_D_ANGLE = 0.4 # P_angle.D of the firmware
+FOC_LPF_ANGLE_TF = 0.02 # seconds, LPF_angle.Tf of the firmware
+TWIN_VELOCITY_TAU = 0.005 # seconds, time constant of the velocity loop in the digital twin (assumed, not measured)
+TWIN_DT = 0.001 # seconds, time step of the digital twin
+GEAR_RATIO = 3 # motor angle per joint angle
+ENCODER_RESOLUTION = 2 * 3.141592653589793 / 4096 # radians, one step of the AS5600 (12 bit) on the motor shaft
+DEDUP_THRESHOLD = None # radians of motor angle, commands that change less are skipped (DrawingBot(dedup=True)), None: ENCODER_RESOLUTION
+DEDUP_KEEP_ALIVE = 50 # samples, every axis gets a command at least this often even if it does not move
+USB_ID = '/dev/ttyUSB0'  #
+SERIAL_PORT = None # serial device of the bridge, None: COM3 on Windows, USB_ID on macOS, /dev/ttyUSB0 on Linux
@@ -48,6 +48,35 @@ def ik_delta(p):
     q0,_ = ik_serial(x+d,y,False) # arm left
     return np.array([q0,q1])
 
+# link lengths and half base width (l1, l2, d) of geometry, the module constants above if geometry is None
+def lengths(geometry=None):
+    return (l1, l2, d) if geometry is None else tuple(float(v) for v in geometry)
+
+# The batch functions below take an optional geometry (l1, l2, d) in meters, for robots built with other links.
+
+# vectorized ik_serial, x and y are arrays, returns (q1, q2, reachable)
+def ik_serial_batch(x, y, positive=True, geometry=None):
+    l1, l2, _ = lengths(geometry)
+    sign = 1 if positive else -1
+    c2 = (x*x + y*y - l1*l1 - l2*l2) / (2*l1*l2)
+    reachable = np.abs(c2) <= 1
+    q2 = sign * np.arccos(np.clip(c2, -1, 1))
+    q1 = np.arctan2(y, x) - np.arctan2(l2 * np.sin(q2), l1 + l2*np.cos(q2))
+    return q1, q2, reachable
+
+# calculates angles of both arms for a whole trajectory
+# positions: (N, 2) array, unit: divisor to get to meters (1000 for mm, 100 for cm, 1 for m)
+# returns an (N, 2) array of [q0, q1] and a boolean mask of reachable positions, unreachable rows are nan
+def ik_delta_batch(positions, unit=1, geometry=None):
+    _, _, d = lengths(geometry)
+    p = np.asarray(positions, dtype=float).reshape(-1, 2) / unit
+    q1, _, right_ok = ik_serial_batch(p[:, 0] - d, p[:, 1], True, geometry) # arm right
+    q0, _, left_ok = ik_serial_batch(p[:, 0] + d, p[:, 1], False, geometry) # arm left
+    reachable = right_ok & left_ok
+    angles = np.stack([q0, q1], axis=1)
+    angles[~reachable] = np.nan
+    return angles, reachable
+
 # plots both arms
 def plot_delta(q,line="o-"):
     plt.axis('equal')
@@ -94,12 +123,61 @@ def fk_delta(q,positive=True):
     (x3, y3, x4, y4) = get_intersections(x0,y0,l2,x1,y1,l2)
     return (np.array([x4,y4]))
 
-def J(q):
-    eps = 1e-6
-    dq0 = eps * np.array([1,0]) 
-    dq1 = eps * np.array([0,1])
+# closed form fk_delta for an (N, 2) array of joint configurations
+# returns an (N, 2) array of end-effector positions (meters) and a boolean mask of valid configurations
+def fk_delta_batch(q, geometry=None):
+    _, l2, _ = lengths(geometry)
+    q = np.asarray(q, dtype=float).reshape(-1, 2)
+    a = _elbows_batch(q, geometry)
+    b = a[:, 1] - a[:, 0]
+    dist = np.hypot(b[:, 0], b[:, 1])
+    valid = (dist > 0) & (dist <= 2*l2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        h = np.sqrt(l2**2 - (dist/2)**2)
+        x = (a[:, 0, 0] + a[:, 1, 0])/2 - h*b[:, 1]/dist
+        y = (a[:, 0, 1] + a[:, 1, 1])/2 + h*b[:, 0]/dist
+    p = np.stack([x, y], axis=1)
+    p[~valid] = np.nan
+    return p, valid
+
+# analytic jacobian d(x, y)/d(q0, q1) for an (N, 2) array of joint configurations
+# returns an (N, 2, 2) array (same layout as J) and the condition number of every sample (inf at singularities)
+def jacobian_batch(q, positions=None, geometry=None):
+    l1, _, _ = lengths(geometry)
+    q = np.asarray(q, dtype=float).reshape(-1, 2)
+    if positions is None:
+        positions, _ = fk_delta_batch(q, geometry)
+    a = _elbows_batch(q, geometry)
+    # distal links (elbow -> end-effector) and elbow velocities per unit joint rotation
+    links = positions[:, None, :] - a
+    elbow_speed = l1 * np.stack([-np.sin(q), np.cos(q)], axis=2)
+    rhs = np.einsum('nij,nij->ni', links, elbow_speed)
+    det = links[:, 0, 0]*links[:, 1, 1] - links[:, 0, 1]*links[:, 1, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jac = np.empty((len(q), 2, 2))
+        jac[:, 0, 0] =  links[:, 1, 1] * rhs[:, 0] / det
+        jac[:, 0, 1] = -links[:, 0, 1] * rhs[:, 1] / det
+        jac[:, 1, 0] = -links[:, 1, 0] * rhs[:, 0] / det
+        jac[:, 1, 1] =  links[:, 0, 0] * rhs[:, 1] / det
+    finite = np.isfinite(jac).all(axis=(1, 2))
+    cond = np.full(len(q), np.inf)
+    if finite.any():
+        sv = np.linalg.svd(jac[finite], compute_uv=False)
+        with np.errstate(divide='ignore'):
+            cond[finite] = sv[:, 0] / sv[:, 1]
+    return jac, cond
 
-    return 1./eps * np.array([fk_delta(q+dq0) - fk_delta(q),fk_delta(q+dq1) - fk_delta(q)]).T
+# positions of both elbows, (N, 2 arms, xy)
+def _elbows_batch(q, geometry=None):
+    l1, _, d = lengths(geometry)
+    return np.stack([
+        np.stack([-d + l1*np.cos(q[:, 0]), l1*np.sin(q[:, 0])], axis=1),
+        np.stack([ d + l1*np.cos(q[:, 1]), l1*np.sin(q[:, 1])], axis=1),
+    ], axis=1)
+
+def J(q):
+    jac, _ = jacobian_batch(q)
+    return jac[0]
     
 def plot_box():
     plt.plot([-0.105,0.105,0.105,-0.105,-0.105],[0.04,0.04,-0.04,-0.04,0.04])
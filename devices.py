@@ -0,0 +1,140 @@
+import os
+import json
+import tempfile
+import threading
+from drawing_bot_api.config import *
+from drawing_bot_api.transport import make_transport
+
+# Registry of the robots of one station. Every device has its own serial port, transport address, bridge
+# (lock file and health port, see supervisor.py) and geometry, so several bots can draw at the same time:
+#   registry = get_registry()
+#   registry.add('left', serial_port='/dev/ttyUSB0')
+#   registry.add('right', serial_port='/dev/ttyUSB1', geometry=[0.06, 0.125, 0.065])
+#   execute_all([DrawingBot(device='left'), DrawingBot(device='right')])
+# The registry is stored as JSON in DEVICE_REGISTRY_PATH. DEFAULT_DEVICE is always there and uses the
+# settings of config.py, a DrawingBot without device uses it.
+# DOMAIN_BOX, DOMAIN_DOME and JOINT_LIMITS stay global, check them when a geometry differs a lot from the default.
+
+DEFAULT_DEVICE = 'default'
+
+class Device:
+    def __init__(self, name, serial_port=None, transport=TRANSPORT, address=None, health_port=BRIDGE_HEALTH_PORT,
+                 lock_path=BRIDGE_LOCK_PATH, geometry=None):
+        # serial_port: serial device of the robot, None uses the default port of the platform (serial_com.py)
+        # transport, address: transport between API and bridge, see transport.make_transport
+        # health_port, lock_path: of the bridge of this device, see supervisor.py
+        # geometry: (l1, l2, d) in meters, None uses the constants of delta_utils
+        self.name = name
+        self.serial_port = serial_port
+        self.transport = transport
+        self.address = address
+        self.health_port = health_port
+        self.lock_path = lock_path
+        self.geometry = None if geometry is None else [float(v) for v in geometry]
+
+    def make_transport(self):
+        return make_transport(self.transport, self.address)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __repr__(self):
+        return f'Device({self.name!r}, serial_port={self.serial_port!r}, {self.make_transport()}, health_port={self.health_port})'
+
+class Device_registry:
+    def __init__(self, path=DEVICE_REGISTRY_PATH):
+        self.path = os.path.expanduser(path)
+        self.devices = {DEFAULT_DEVICE: Device(DEFAULT_DEVICE)}
+        try:
+            with open(self.path) as _file:
+                for _data in json.load(_file):
+                    _device = Device.from_dict(_data)
+                    self.devices[_device.name] = _device
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        with open(self.path, 'w') as _file:
+            json.dump([_device.to_dict() for _name, _device in self.devices.items() if _name != DEFAULT_DEVICE], _file, indent=2)
+
+    def add(self, name, serial_port=None, transport=TRANSPORT, address=None, geometry=None):
+        # registers a device with its own socket port / path / shared memory, health port and lock file and saves the registry
+        if name == DEFAULT_DEVICE:
+            raise ValueError(f'"{DEFAULT_DEVICE}" is reserved for the settings of config.py.')
+        _socket_port, _health_port = self._free_ports(exclude=name)
+        if address is None:
+            address = {'tcp': _socket_port, 'unix': os.path.join(tempfile.gettempdir(), f'drawing_bot_{name}.sock'), 'shm': f'drawing_bot_{name}'}[transport]
+        _lock_path = os.path.join(tempfile.gettempdir(), f'drawing_bot_bridge_{name}.lock')
+        device = Device(name, serial_port, transport, address, _health_port, _lock_path, geometry)
+        self.devices[name] = device
+        self.save()
+        return device
+
+    def remove(self, name):
+        if name != DEFAULT_DEVICE and self.devices.pop(name, None) is not None:
+            self.save()
+
+    def _free_ports(self, exclude=None):
+        # first pair of ports from DEVICE_PORT_BASE on that no other device uses
+        _used = set()
+        for _name, _device in self.devices.items():
+            if _name != exclude:
+                _used.add(_device.health_port)
+                if _device.transport == 'tcp':
+                    _used.add(int(_device.address) if _device.address is not None else SOCKET_PORT)
+        _port = DEVICE_PORT_BASE
+        while _port in _used or _port + 1 in _used:
+            _port += 2
+        return _port, _port + 1
+
+    def __getitem__(self, name):
+        if name not in self.devices:
+            raise KeyError(f'Unknown device "{name}", registered: {", ".join(self.devices)}')
+        return self.devices[name]
+
+    def __contains__(self, name):
+        return name in self.devices
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def __len__(self):
+        return len(self.devices)
+
+_registry = None
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = Device_registry()
+    return _registry
+
+def get_device(device=None):
+    # Device for a name, a Device or None (DEFAULT_DEVICE)
+    if isinstance(device, Device):
+        return device
+    return get_registry()[DEFAULT_DEVICE if device is None else device]
+
+def execute_all(bots, **kwargs):
+    # Runs execute() of every bot in its own thread. Each bot has its own bridge connection and Pacing_scheduler,
+    # so the drawings are paced independently. Returns the results in the order of bots, an exception that
+    # ended a drawing is returned in place of its result.
+    kwargs.setdefault('promting', False) # the prompts of several bots would interleave
+    results = [None] * len(bots)
+
+    def _run(index, bot):
+        try:
+            results[index] = bot.execute(**kwargs)
+        except Exception as e:
+            results[index] = e
+
+    _threads = [threading.Thread(target=_run, args=(_index, bot), daemon=True) for _index, bot in enumerate(bots)]
+    for _thread in _threads:
+        _thread.start()
+    for _thread in _threads:
+        _thread.join()
+    return results
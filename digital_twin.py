@@ -0,0 +1,103 @@
+import numpy as np
+from drawing_bot_api.delta_utils import fk_delta_batch
+from drawing_bot_api.config import *
+
+# Simulates both BLDC axes with the angle loop settings of the firmware (SimpleFOC):
+#   shaft angle   = LPF_angle(encoder angle), time constant FOC_LPF_ANGLE_TF
+#   velocity cmd  = P_angle(target - shaft angle), P = FOC_P_ANGLE, D = FOC_D_ANGLE, limited to MOTOR_VELOCITY_LIMIT
+#   velocity loop = first order lag with TWIN_VELOCITY_TAU (not identified on the robot, an assumption)
+# Command streams are parsed from the exact messages DrawingBot.execute() would send, every message holds its
+# target from its pacing slot on (zero-order hold). The loop runs at TWIN_DT and is vectorized over both axes,
+# a drawing of a few seconds simulates in a fraction of that.
+class Digital_twin:
+    def __init__(self, p=FOC_P_ANGLE, d=FOC_D_ANGLE, velocity_limit=MOTOR_VELOCITY_LIMIT, tf=FOC_LPF_ANGLE_TF,
+                 velocity_tau=TWIN_VELOCITY_TAU, dt=TWIN_DT):
+        self.p = p
+        self.d = d
+        self.velocity_limit = velocity_limit
+        self.tf = tf
+        self.velocity_tau = velocity_tau
+        self.dt = dt
+
+    # command_times: (N,) seconds, targets: (N, 2) motor angles [W, E], nan keeps the previous target of that axis
+    # returns time (T,) and motor angles (T, 2) of the simulation
+    def simulate(self, command_times, targets, initial=None, settle_time=0.2):
+        _targets = np.array(targets, dtype=float).reshape(-1, 2)
+        for _axis in range(2): # forward fill skipped commands
+            _valid = np.flatnonzero(~np.isnan(_targets[:, _axis]))
+            if not _valid.size:
+                raise ValueError('Command stream has no target for one of the axes.')
+            _index = np.maximum.accumulate(np.where(np.isnan(_targets[:, _axis]), 0, np.arange(len(_targets))))
+            _index[:_valid[0]] = _valid[0]
+            _targets[:, _axis] = _targets[_index, _axis]
+
+        _time = np.arange(0, command_times[-1] + settle_time, self.dt)
+        _held = _targets[np.clip(np.searchsorted(command_times, _time, side='right') - 1, 0, None)]
+
+        _angle = _targets[0].copy() if initial is None else np.array(initial, dtype=float)
+        _filtered = _angle.copy()
+        _velocity = np.zeros(2)
+        _previous_error = _held[0] - _filtered
+        _alpha = self.dt / (self.tf + self.dt)
+        _beta = self.dt / (self.velocity_tau + self.dt)
+        _angles = np.empty((len(_time), 2))
+
+        for _step in range(len(_time)):
+            _error = _held[_step] - _filtered
+            _velocity_command = np.clip(self.p * _error + self.d * (_error - _previous_error) / self.dt,
+                                        -self.velocity_limit, self.velocity_limit)
+            _previous_error = _error
+            _velocity += _beta * (_velocity_command - _velocity)
+            _angle += _velocity * self.dt
+            _filtered += _alpha * (_angle - _filtered)
+            _angles[_step] = _angle
+
+        return _time, _angles
+
+    # predicted drawing of a DrawingBot, in the units of the bot
+    def simulate_bot(self, bot, points=None):
+        _messages = bot.command_stream(points)
+        if not _messages:
+            raise ValueError('Nothing to simulate, the trajectory is empty or failed the preflight check.')
+        _period = SERIAL_DELAY
+        _targets = np.full((len(_messages), 2), np.nan)
+        for _index, message in enumerate(_messages):
+            _text = bytes(message).decode('utf-8') if not isinstance(message, str) else message
+            for _line in _text.split():
+                _targets[_index, 0 if _line[0] == 'W' else 1] = float(_line[1:])
+        _command_times = np.arange(len(_messages)) * _period
+
+        _time, _motor_angles = self.simulate(_command_times, _targets)
+        _joint_angles = _motor_angles / GEAR_RATIO
+        _positions, _valid = fk_delta_batch(_joint_angles, bot.geometry)
+
+        # planned position of every slot, compared with where the pen is at that time
+        _planned, _ = bot._get_trajectory(points)
+        _planned_times = np.arange(len(_planned)) * _period * bot._messages_per_point()
+        _at_planned = np.clip(np.searchsorted(_time, _planned_times), 0, len(_time) - 1)
+        _error = np.hypot(*(_positions[_at_planned] * bot.unit - _planned).T)
+        return {
+            'time': _time,
+            'motor_angles': _motor_angles,
+            'joint_angles': _joint_angles,
+            'positions': _positions * bot.unit,
+            'valid': _valid,
+            'planned': _planned,
+            'planned_times': _planned_times,
+            'tracking_error': _error,
+            'max_error': float(np.nanmax(_error)),
+            'rms_error': float(np.sqrt(np.nanmean(_error ** 2))),
+        }
+
+    # max and rms tracking error of the current shapes of bot at every speed, restores the speed of the bot
+    def sweep(self, bot, speeds):
+        _speed = bot.speed
+        results = []
+        try:
+            for speed in speeds:
+                bot.speed = speed
+                _result = self.simulate_bot(bot)
+                results.append({'speed': speed, 'max_error': _result['max_error'], 'rms_error': _result['rms_error']})
+        finally:
+            bot.speed = _speed
+        return results
@@ -0,0 +1,118 @@
+from math import ceil, log10
+import numpy as np
+from drawing_bot_api.config import *
+
+# Fixed-precision wire encoding of motor commands ('W1.234\n', 'E-0.567\n').
+# The whole angle array is turned into one preassembled bytes buffer with NumPy, without formatting
+# a Python string per message.
+
+# smallest number of decimals that resolves one encoder step of the motor angle
+def encoder_decimals(resolution=ENCODER_RESOLUTION):
+    return max(0, int(ceil(-log10(resolution))))
+
+# Boolean (N, 2) mask of the motor commands worth sending. A command is dropped when the motor angle stays in the
+# same threshold wide bin as the previous sample, so the target the robot holds is never further than threshold
+# from the planned one. The first and last sample and every keep_alive-th sample are always sent.
+def dedup_mask(angles, threshold=None, keep_alive=DEDUP_KEEP_ALIVE):
+    _threshold = ENCODER_RESOLUTION if threshold is None else threshold
+    _bins = np.floor(GEAR_RATIO * np.asarray(angles, dtype=float).reshape(-1, 2) / _threshold)
+    _mask = np.ones(_bins.shape, dtype=bool)
+    _mask[1:] = _bins[1:] != _bins[:-1]
+    _mask[::keep_alive] = True
+    _mask[-1:] = True
+    return _mask
+
+class Encoded_trajectory:
+    # data: all messages back to back, offsets: start of every message in data plus the end of the last one
+    # Dropped messages (see dedup_mask) stay in as empty messages, so they still take up their pacing slot.
+    def __init__(self, data, offsets, saved_bytes=0):
+        self.data = data
+        self.offsets = offsets
+        self.saved_bytes = saved_bytes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        # messages as zero-copy slices of data
+        _view = memoryview(self.data)
+        _offsets = self.offsets.tolist()
+        for _start, _end in zip(_offsets[:-1], _offsets[1:]):
+            yield _view[_start:_end]
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def paired(self):
+        # W and E command of every point joined into one message, so both targets go out in one write
+        return Encoded_trajectory(self.data, self.offsets[::2], self.saved_bytes)
+
+    def bandwidth(self, period=SERIAL_DELAY):
+        # link usage if every message gets one pacing slot of period seconds, 8N1 framing (10 bits per byte)
+        _duration = max(len(self), 1) * period
+        _bytes_per_second = len(self.data) / _duration
+        _capacity = BAUD / 10
+        return {
+            'bytes': len(self.data),
+            'messages': len(self),
+            'duration': _duration,
+            'bytes_per_second': _bytes_per_second,
+            'link_capacity': _capacity,
+            'link_utilisation': _bytes_per_second / _capacity,
+            'saved_bytes': self.saved_bytes,
+            'saved_fraction': self.saved_bytes / max(len(self.data) + self.saved_bytes, 1),
+        }
+
+# angles: (N, 2) joint angles [q0, q1], encoded as W (q0) and E (q1) motor angles (GEAR_RATIO * joint angle)
+# send_mask: optional (N, 2) boolean mask, commands that are not set are encoded as empty messages
+def encode_angles(angles, decimals=None, sides=b'WE', send_mask=None):
+    _decimals = encoder_decimals() if decimals is None else decimals
+    _values = GEAR_RATIO * np.asarray(angles, dtype=float).reshape(-1, 2)
+    _scale = 10 ** _decimals
+    _scaled = np.rint(np.abs(_values) * _scale).astype(np.int64)
+    _integer = _scaled // _scale
+    _fraction = _scaled % _scale
+    _negative = (_values < 0) & (_scaled > 0)
+
+    _integer_digits = np.ones(_integer.shape, dtype=np.int64)
+    _max_integer_digits = len(str(int(_integer.max()))) if _integer.size else 1
+    for _digit in range(1, _max_integer_digits):
+        _integer_digits += _integer >= 10 ** _digit
+
+    # character matrix with one row per message, unused cells are masked out at the end
+    _width = 1 + 1 + _max_integer_digits + (1 + _decimals if _decimals else 0) + 1
+    _chars = np.zeros(_values.shape + (_width,), dtype=np.uint8)
+    _used = np.zeros(_chars.shape, dtype=bool)
+
+    _chars[:, :, 0] = np.frombuffer(sides, dtype=np.uint8)
+    _used[:, :, 0] = True
+    _chars[:, :, 1] = ord('-')
+    _used[:, :, 1] = _negative
+
+    for _digit in range(_max_integer_digits): # most significant first, right aligned
+        _column = 2 + _digit
+        _power = _max_integer_digits - 1 - _digit
+        _chars[:, :, _column] = ord('0') + (_integer // 10 ** _power) % 10
+        _used[:, :, _column] = _integer_digits > _power
+
+    _column = 2 + _max_integer_digits
+    if _decimals:
+        _chars[:, :, _column] = ord('.')
+        _used[:, :, _column] = True
+        for _digit in range(_decimals):
+            _chars[:, :, _column + 1 + _digit] = ord('0') + (_fraction // 10 ** (_decimals - 1 - _digit)) % 10
+            _used[:, :, _column + 1 + _digit] = True
+        _column += 1 + _decimals
+    _chars[:, :, _column] = ord('\n')
+    _used[:, :, _column] = True
+
+    _saved_bytes = 0
+    if send_mask is not None:
+        _dropped = ~np.asarray(send_mask, dtype=bool).reshape(_values.shape)
+        _saved_bytes = int(_used[_dropped].sum())
+        _used[_dropped] = False
+
+    _lengths = _used.sum(axis=2).ravel()
+    _offsets = np.zeros(len(_lengths) + 1, dtype=np.int64)
+    np.cumsum(_lengths, out=_offsets[1:])
+    return Encoded_trajectory(_chars[_used].tobytes(), _offsets, _saved_bytes)
@@ -0,0 +1,127 @@
+import time
+import threading
+import collections
+import numpy as np
+from drawing_bot_api.config import *
+from drawing_bot_api.preflight import preflight
+from drawing_bot_api.encoding import encode_angles
+from drawing_bot_api.serial_handler import Serial_handler
+
+# Interactive positioning (keyboard, mouse, GUI). move() can be called at any rate from any thread, a worker thread
+# solves the IK of the newest target and sends it right away over a persistent bridge connection, at most one
+# target per JOG_PERIOD. Targets that arrive in the meantime replace each other (latest value wins), so the pen
+# never works through a backlog of stale positions.
+#   with drawing_bot.jog() as jog:
+#       jog.move([0, 100])
+#       jog.move([10, 100])
+# Targets outside the domain or the joint limits are dropped, the robot stays at the last valid one.
+class Jog:
+    def __init__(self, bot, period=JOG_PERIOD, history=JOG_HISTORY):
+        self.bot = bot
+        self.period = period
+        self.handler = None
+        self.own_handler = False # False while the bot has a session(), its handler is used and kept open
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pending = None # (position, time.monotonic() of move()) of the newest target not sent yet
+        self.position = None # last target sent, in the unit of the bot
+        self.sent = collections.deque(maxlen=history) # (time of move(), time of the send, message)
+        self.dropped = 0 # targets replaced by a newer one before they were sent
+        self.rejected = 0 # targets outside the domain or the joint limits
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        # connects to the bridge (blocks until it attached) and starts the worker thread
+        self.handler = self.bot._serial_handler
+        self.own_handler = self.handler is None
+        if self.own_handler:
+            self.handler = Serial_handler(persistent=True, transport=self.bot.device.make_transport(), health_port=self.bot.device.health_port)
+        self.handler.connect()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # the target that is still waiting is dropped
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.own_handler and self.handler is not None:
+            self.handler.close()
+        self.handler = None
+
+    def __enter__(self):
+        return self if self.running else self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def move(self, position):
+        # position: [x, y] in the unit of the bot, returns at once
+        with self.lock:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = (np.asarray(position, dtype=float), time.monotonic())
+        self.wake.set()
+
+    def latency(self):
+        # seconds from move() to the write to the bridge of the sent targets, the UART adds about 1.5 ms per target at 115200 baud
+        _delays = np.array([_sent - _requested for _requested, _sent, _message in tuple(self.sent)])
+        if not len(_delays):
+            return {'sent': 0, 'dropped': self.dropped, 'rejected': self.rejected}
+        return {
+            'sent': len(_delays),
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'median': float(np.median(_delays)),
+            'p95': float(np.percentile(_delays, 95)),
+            'max': float(_delays.max()),
+        }
+
+    def _run(self):
+        _next = 0.0 # earliest time of the next send
+        _rejecting = False
+        while True:
+            self.wake.wait()
+            if not self.running:
+                return
+            time.sleep(max(0.0, _next - time.monotonic())) # targets arriving meanwhile replace the pending one
+            with self.lock:
+                _target, self.pending = self.pending, None
+                self.wake.clear()
+            if _target is None:
+                continue
+
+            _position, _requested = _target
+            _message = self._message(_position)
+            if _message is None:
+                self.rejected += 1
+                if not _rejecting:
+                    self.bot.error_handler(f'Jog target {_position} is outside of robots domain, it is skipped.', warning=True)
+                _rejecting = True
+                continue
+            _rejecting = False
+
+            try:
+                self.handler.send_now(_message)
+            except OSError as e:
+                print(f'⚠️ Jog target not sent: {e}')
+                continue
+            _sent = time.monotonic()
+            _next = _sent + self.period
+            self.position = _position
+            self.sent.append((_requested, _sent, _message))
+
+    def _message(self, position):
+        # W and E of position as one write, None if the position fails the preflight check
+        _report = preflight(position, unit=self.bot.unit, ik_solver=self.bot.ik_solver)
+        if not _report:
+            return None
+        _angles = _report.angles[0]
+        if self.bot.encoding_decimals is None:
+            return (self.bot._format_angle(_angles[0], 'W') + self.bot._format_angle(_angles[1], 'E')).encode('utf-8')
+        return bytes(encode_angles(_angles, self.bot.encoding_decimals).paired()[0])
@@ -1,40 +1,11 @@
 #!/usr/bin/env python3
 import sys
-import subprocess
-from pathlib import Path
 
 from drawing_bot_api import DrawingBot
 from drawing_bot_api.shapes import Line, PartialCircle
 
-# --- Start the serial bridge (portable, no absolute paths) ---
-_serial_proc = None
-
-def ensure_serial_running():
-    """Launch drawing_bot_api/serial_com.py in the background if not already running."""
-    global _serial_proc
-    if _serial_proc and (_serial_proc.poll() is None):
-        return  # already running in this process
-
-    # serial_com.py lives inside the package folder next to this file
-    api_dir = Path(__file__).resolve().parent / "drawing_bot_api"
-    serial_script = api_dir / "serial_com.py"
-
-    if not serial_script.exists():
-        print(f"[WARN] serial_com.py not found at: {serial_script}")
-        return
-
-    py = sys.executable  # use the current interpreter / venv
-    try:
-        _serial_proc = subprocess.Popen(
-            [py, serial_script.name],
-            cwd=str(api_dir),                   # critical: so 'from config import *' works
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.STDOUT,
-            start_new_session=True
-        )
-        print("[INFO] serial_com started in background.")
-    except Exception as e:
-        print(f"[ERROR] Could not start serial_com: {e}")
+# --- Start the serial bridge, or attach to the one already running (supervisor.py) ---
+from drawing_bot_api.supervisor import ensure_bridge_running
 
 # --- Create the bot ---
 drawing_bot = DrawingBot(unit='mm', speed=200)
@@ -302,7 +273,7 @@ DISPATCH = {
 }
 
 def main():
-    ensure_serial_running()
+    ensure_bridge_running()
 
     if len(sys.argv) >= 2:
         choice_word = sys.argv[1].strip().lower()
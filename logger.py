@@ -16,6 +16,7 @@ class ErrorCode:
     DOMAIN_ERROR = 1
     COMMUNICATION_ERROR = 2
     NO_SHAPES_ERROR = 3
+    ARTIFACT_ERROR = 4
 
 class Log:
     def __init__(self, verbose):
@@ -0,0 +1,81 @@
+import numpy as np
+from drawing_bot_api.delta_utils import ik_delta_batch
+from drawing_bot_api import shapes
+from drawing_bot_api.config import *
+
+REASON_UNREACHABLE = 'unreachable'
+REASON_DOMAIN = 'outside domain'
+REASON_JOINT_LIMIT = 'joint limit'
+
+class Preflight_report:
+    def __init__(self, number_of_points):
+        self.number_of_points = number_of_points
+        self.issues = [] # dicts with shape (index into DrawingBot.shapes, -1 for user defined points), start, end (inclusive sample indices), reason, first_point
+        self.angles = None
+
+    @property
+    def ok(self):
+        return not self.issues
+
+    def __bool__(self):
+        return self.ok
+
+    def __str__(self):
+        if self.ok:
+            return f'Preflight passed ({self.number_of_points} points).'
+        _lines = [f'Preflight failed ({len(self.issues)} issues in {self.number_of_points} points):']
+        for _issue in self.issues:
+            _shape = 'points' if _issue['shape'] < 0 else f'shape {_issue["shape"]}'
+            _lines.append(f'  {_shape}, samples {_issue["start"]}-{_issue["end"]}: {_issue["reason"]} (first at {[round(float(v), 3) for v in _issue["first_point"]]})')
+        return '\n'.join(_lines)
+
+# raised for a target that fails the check (move_to_point, add_positions) and by a streamed trajectory at the first
+# chunk that fails, which ends the stream after the chunks before it
+class Preflight_error(ValueError):
+    def __init__(self, report):
+        super().__init__(str(report))
+        self.report = report
+
+# returns a boolean mask of the points inside DOMAIN_BOX + DOMAIN_DOME, points are in the unit given by unit (see DrawingBot.unit)
+def in_domain(points, unit=1000):
+    _points = np.asarray(points, dtype=float).reshape(-1, 2) * (1000 / unit) # domain is defined in mm
+    _eps = 1e-9
+    _dome = shapes.PartialCircle(DOMAIN_DOME[0], DOMAIN_DOME[1], DOMAIN_DOME[2], DOMAIN_DOME[3])
+    _x, _y = _points[:, 0], _points[:, 1]
+    _in_box = (_x >= DOMAIN_BOX[0][0] - _eps) & (_x <= DOMAIN_BOX[3][0] + _eps) & (_y >= DOMAIN_BOX[0][1] - _eps)
+    _below_top = _y <= DOMAIN_BOX[1][1] + _eps
+    _in_dome = np.hypot(_x - _dome.center_point[0], _y - _dome.center_point[1]) <= _dome.radius + _eps
+    return _in_box & (_below_top | _in_dome)
+
+# vectorized check of a whole trajectory against reachability, the domain and JOINT_LIMITS
+# shape_index: array with the index of the shape every point belongs to (optional)
+# index_offset: added to the reported sample indices, for checking a trajectory chunk by chunk
+def preflight(points, shape_index=None, unit=1000, ik_solver=ik_delta_batch, index_offset=0):
+    _points = np.asarray(points, dtype=float).reshape(-1, 2)
+    _shape_index = np.full(len(_points), -1) if shape_index is None else np.asarray(shape_index)
+    report = Preflight_report(len(_points))
+
+    _angles, _reachable = ik_solver(_points, unit)
+    _limits = np.asarray(JOINT_LIMITS)
+    with np.errstate(invalid='ignore'):
+        _within_limits = ((_angles >= _limits[:, 0]) & (_angles <= _limits[:, 1])).all(axis=1)
+
+    for _reason, _bad in ((REASON_UNREACHABLE, ~_reachable),
+                          (REASON_DOMAIN, ~in_domain(_points, unit)),
+                          (REASON_JOINT_LIMIT, _reachable & ~_within_limits)):
+        for _start, _end in _runs(_bad, _shape_index):
+            report.issues.append({'shape': int(_shape_index[_start]), 'start': int(_start) + index_offset, 'end': int(_end) + index_offset, 'reason': _reason, 'first_point': _points[_start]})
+
+    report.issues.sort(key=lambda issue: issue['start'])
+    report.angles = _angles
+    return report
+
+# (start, end) index pairs of the runs where mask is set, runs are split at shape boundaries
+def _runs(mask, shape_index):
+    if not mask.any():
+        return []
+    _boundary = np.ones(len(mask), dtype=bool)
+    _boundary[1:] = (~mask[:-1]) | (shape_index[1:] != shape_index[:-1])
+    _starts = np.flatnonzero(mask & _boundary)
+    _ends = np.append(_starts[1:], len(mask))
+    return [(_start, _start + np.argmin(np.append(mask[_start:_end], False)) - 1) for _start, _end in zip(_starts, _ends)]
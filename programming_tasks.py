@@ -1,42 +1,14 @@
 #!/usr/bin/env python3
 import sys
-import subprocess
-from pathlib import Path
 
 from drawing_bot_api import DrawingBot
 from drawing_bot_api.shapes import *  # Line, Circle, PartialCircle, etc.
 
 # --- Launch the serial bridge so the bot can talk to the microcontroller ---
-# This part calls the file: drawing_bot_api/serial_com.py
+# This part starts drawing_bot_api/serial_com.py once and reuses it in later runs (drawing_bot_api/supervisor.py)
 # That script handles the communication between Python and the robot's microcontroller
 # Students do NOT need to change anything here.
-_serial_proc = None
-
-def ensure_serial_running():
-    """Start drawing_bot_api/serial_com.py in the background (only if not running)."""
-    global _serial_proc
-    if _serial_proc and (_serial_proc.poll() is None):
-        return  # Already running
-
-    api_dir = Path(__file__).resolve().parent / "drawing_bot_api"
-    serial_script = api_dir / "serial_com.py"
-
-    if not serial_script.exists():
-        print(f"[WARN] serial_com.py not found at: {serial_script}")
-        return
-
-    py = sys.executable  # current Python interpreter
-    try:
-        _serial_proc = subprocess.Popen(
-            [py, serial_script.name],
-            cwd=str(api_dir),                   # so "from config import *" works
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.STDOUT,
-            start_new_session=True
-        )
-        print("[INFO] serial_com started in background.")
-    except Exception as e:
-        print(f"[ERROR] Could not start serial_com: {e}")
+from drawing_bot_api.supervisor import ensure_bridge_running
 
 
 # --- Create the bot object ---
@@ -150,7 +122,7 @@ DISPATCH = {
 }
 
 def main():
-    ensure_serial_running()
+    ensure_bridge_running()
 
     if len(sys.argv) >= 2:
         choice_word = sys.argv[1].strip().lower()
@@ -0,0 +1,58 @@
+import time
+import numpy as np
+from drawing_bot_api.config import *
+
+class Pacing_scheduler:
+    # Paces messages against absolute deadlines on the monotonic clock: message i is due at start + i * period.
+    # A late message does not shift the following ones, the scheduler sends without waiting until it caught up.
+    # If it falls behind by more than catch_up_budget seconds the remaining deadlines are moved back so that it
+    # is exactly catch_up_budget behind, the drawing then gets longer by the excess instead of rushing through it.
+    def __init__(self, period=SERIAL_DELAY, catch_up_budget=PACING_CATCH_UP_BUDGET, spin=PACING_SPIN):
+        self.period = period
+        self.catch_up_budget = catch_up_budget
+        self.spin = spin # the last part of every wait is busy-waited, time.sleep overshoots by up to a few 100 us
+        self.start_time = None
+        self.index = 0
+        self.shift = 0.0
+        self.lateness = [] # seconds between the deadline and the actual send time of every message
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self.index = 0
+        self.shift = 0.0
+        self.lateness = []
+
+    def deadline(self, index=None):
+        _index = self.index if index is None else index
+        return self.start_time + self.shift + _index * self.period
+
+    def wait(self):
+        # blocks until the next message is due, call it right before sending
+        if self.start_time is None:
+            self.start()
+
+        _deadline = self.deadline()
+        _remaining = _deadline - time.monotonic()
+        if _remaining > self.spin:
+            time.sleep(_remaining - self.spin)
+        while time.monotonic() < _deadline:
+            pass
+
+        _lateness = time.monotonic() - _deadline
+        if _lateness > self.catch_up_budget:
+            self.shift += _lateness - self.catch_up_budget
+        self.lateness.append(_lateness)
+        self.index += 1
+
+    def report(self):
+        _lateness = np.asarray(self.lateness)
+        if not _lateness.size:
+            return {'messages': 0}
+        return {
+            'messages': int(_lateness.size),
+            'planned_duration': (_lateness.size - 1) * self.period,
+            'duration': float((_lateness.size - 1) * self.period + self.shift + _lateness[-1]),
+            'mean_lateness': float(_lateness.mean()),
+            'p99_lateness': float(np.percentile(_lateness, 99)),
+            'max_lateness': float(_lateness.max()),
+        }
@@ -1,27 +1,100 @@
 import serial
 from drawing_bot_api.config import *
+from drawing_bot_api.transport import make_transport
+from drawing_bot_api.supervisor import acquire_bridge_lock, bridge_pid
+from drawing_bot_api.telemetry import Telemetry_ring, parse_monitor_lines, encode_samples
+import os
 import time
 import setproctitle
-import socket
 import platform
+import sys
+import argparse
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 setproctitle.setproctitle('drawing_bot_serial_com')
 
 
-class Serial_communicator():
+class Pair_monitor():
+    # Measures how long the bridge takes between writing the W and the E half of a point to the UART.
+    # Halves that arrive in the same chunk are written together (gap 0), a chunk ending with a W line
+    # is a split pair, its gap runs until the next chunk starting with an E line is written.
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.pairs = 0
+        self.split_pairs = 0
+        self.total_gap = 0.0
+        self.max_gap = 0.0
+        self.pending_w = None
+
+    def __call__(self, data, timestamp):
+        _sides = [_line[:1] for _line in data.split(b'\n')[:-1]]
+        if not _sides:
+            return
+
+        if self.pending_w is not None and _sides[0] == b'E':
+            _gap = timestamp - self.pending_w
+            self.pairs += 1
+            self.split_pairs += 1
+            self.total_gap += _gap
+            self.max_gap = max(self.max_gap, _gap)
+
+        self.pairs += sum(1 for _first, _second in zip(_sides[:-1], _sides[1:]) if _first == b'W' and _second == b'E')
+        self.pending_w = timestamp if _sides[-1] == b'W' else None
+
+    def summary(self):
+        _mean = self.total_gap / self.split_pairs if self.split_pairs else 0.0
+        return f'{self.pairs} W/E pairs, {self.split_pairs} split, mean gap {_mean*1000:.2f} ms, max gap {self.max_gap*1000:.2f} ms'
+
+
+class Throughput_counter():
+    # replaces the per-message prints, summarised every BRIDGE_STATS_INTERVAL seconds and on disconnect
     def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.start = time.monotonic()
+        self.bytes_written = 0
+        self.messages_written = 0
+        self.writes = 0
+        self.bytes_read = 0
+
+    def written(self, data):
+        self.bytes_written += len(data)
+        self.messages_written += data.count(b'\n')
+        self.writes += 1
+
+    def read(self, data):
+        self.bytes_read += len(data)
+
+    def summary(self):
+        _elapsed = max(time.monotonic() - self.start, 1e-9)
+        return (f'{self.messages_written} messages in {self.writes} writes ({self.messages_written/_elapsed:.0f} msg/s, '
+                f'{self.bytes_written/_elapsed:.0f} B/s to UART, {self.bytes_read/_elapsed:.0f} B/s from UART)')
+
+
+class Serial_communicator():
+    def __init__(self, port=None):
+        # port: serial device, e.g. the pty of virtual_robot.py, None uses the default port of the platform
+        self.port = port if port is not None else SERIAL_PORT
+        self.pair_monitor = Pair_monitor()
+        self.throughput = Throughput_counter()
+        self.read_lock = threading.Lock() # held by is_ready, so the UART reader does not take the reply
+        self.ready = False
+        self.ready_latency = None # seconds from opening the port until the board answered RDY
+        _start = time.monotonic()
         self.serial = self.connect_to_serial_port()
         print('Waiting until drawing bot is ready...')
 
-        # Try for 5 seconds max
-        ready_timeout = time.time() + 5
-        while not self.is_ready():
-            if time.time() > ready_timeout:
-                print("⚠️ Timed out waiting for 'RDY'. Continuing anyway.")
-                break
-            time.sleep(0.5)
-
-        print('Drawing bot is ready.')
+        if not self.wait_until_ready(timeout=5, cached=_ready_cache.get(self.serial.port)):
+            print("⚠️ Timed out waiting for 'RDY'. Continuing anyway.")
+        else:
+            self.ready_latency = time.monotonic() - _start
+            print(f'Drawing bot is ready ({self.ready_latency*1000:.0f} ms).')
 
     def check_connection(self):
         try:
@@ -29,46 +102,107 @@ class Serial_communicator():
             return True
         except:
             print('Serial connection lost.')
+            self.invalidate_ready()
             return False
 
-    def handle_serial_commands(self, message):
+    def write_lines(self, data):
+        # data has to consist of complete lines (framed by Async_bridge), so a command or a W/E pair sent in one
+        # frame is never split between writes
         if not self.serial.is_open:
             self.reconnect()
-        self.serial.write(message)
-        print(f'📨 Wrote {message} to serial_port')
+        try:
+            self.serial.write(data)
+        except (serial.SerialException, OSError):
+            self.invalidate_ready()
+            self.reconnect()
+            self.serial.write(data)
+        self.pair_monitor(data, time.monotonic())
+        self.throughput.written(data)
+
+    def read_available(self):
+        # whatever the board sent, waits at most the port timeout for the first byte
+        with self.read_lock:
+            if not self.serial.is_open:
+                return b''
+            return self.serial.read(max(self.serial.in_waiting, 1))
+
+    def reset_connection_state(self):
+        self.pair_monitor.reset()
+        self.throughput.reset()
 
-    def is_ready(self):
+    def is_ready(self, timeout=READY_TIMEOUT):
+        with self.read_lock:
+            return self._is_ready(timeout)
+
+    def _is_ready(self, timeout):
+        # one probe: I -> RDY, returns as soon as the reply is complete. The input is not flushed before, what
+        # the board printed while homing is logged instead of thrown away (a RDY queued by an earlier probe counts too).
         if not self.serial.is_open:
             self.serial.open()
 
-        self.serial.reset_input_buffer()
         self.serial.write(b'I\n')
-        time.sleep(0.2)
 
-        buffer = []
-        while self.serial.in_waiting:
-            byte = self.serial.read(1)
-            buffer.append(byte.decode('utf-8', errors='ignore'))
+        _port_timeout = self.serial.timeout
+        self.serial.timeout = timeout
+        try:
+            reply = self.serial.read_until(b'RDY')
+        finally:
+            self.serial.timeout = _port_timeout
+
+        self.ready = b'RDY' in reply
+        _output = reply.replace(b'RDY', b'').strip()
+        if _output:
+            print(f"📥 Received from serial: {_output.decode('utf-8', errors='ignore')}")
+        if self.ready:
+            _ready_cache[self.serial.port] = time.time()
+        return self.ready
 
-        joined = ''.join(buffer)
-        print(f"📥 Received from serial: {joined.strip()}")
-        return 'RDY' in joined
+    def wait_until_ready(self, timeout=None, cached=False):
+        # a port that was ready before (in this process or a previous bridge) is probed once with a short
+        # timeout first, a homed board answers within a few ms
+        if cached and self.is_ready(timeout=READY_PROBE_TIMEOUT):
+            return True
+        # Failed probes are spaced READY_RETRY_INTERVAL apart, the ESP32 queues every I while it homes and
+        # answers all of them after setup().
+        _deadline = time.monotonic() + timeout if timeout is not None else None
+        while not self.is_ready():
+            if _deadline is not None and time.monotonic() > _deadline:
+                return False
+            _pause = READY_RETRY_INTERVAL if _deadline is None else min(READY_RETRY_INTERVAL, _deadline - time.monotonic())
+            time.sleep(max(0.0, _pause))
+        return True
+
+    def invalidate_ready(self):
+        self.ready = False
+        _ready_cache.pop(self.serial.port, None)
 
     def restart(self):
+        self.invalidate_ready()
         self.serial.write(b'R')
         self.serial.close()
 
+    def _open_port(self, port):
+        # DTR/RTS are kept low while opening, toggling them resets the ESP32 and it would have to home again
+        serial_port = serial.Serial(None, BAUD, timeout=READ_TIMEOUT, write_timeout=WRITE_TIMEOUT)
+        serial_port.port = port
+        serial_port.dtr = False
+        serial_port.rts = False
+        serial_port.open()
+        return serial_port
+
     def connect_to_serial_port(self):
         while True:
             try:
                 print('Connecting to serial_port...')
 
-                if platform.system() == 'Windows':
-                    serial_port = serial.Serial('COM3', BAUD, write_timeout=WRITE_TIMEOUT)
+                if self.port is not None:
+                    serial_port = self._open_port(self.port)
+                elif platform.system() == 'Windows':
+                    serial_port = self._open_port('COM3')
                 elif platform.system() == 'Darwin':
-                    serial_port = serial.Serial(USB_ID, BAUD, write_timeout=WRITE_TIMEOUT)
+                    serial_port = self._open_port(USB_ID)
                 elif platform.system() == 'Linux':
-                    serial_port = serial.Serial('/dev/ttyUSB0', BAUD, write_timeout=WRITE_TIMEOUT)
+                    serial_port = self._open_port('/dev/ttyUSB0')
                 else:
                     raise EnvironmentError("Unsupported platform")
 
@@ -81,50 +215,336 @@ class Serial_communicator():
 
     def reconnect(self):
         print('Reconnecting serial port')
+        _start = time.monotonic()
         self.serial.close()
         self.serial = self.connect_to_serial_port()
-        while not self.is_ready():
-            time.sleep(0.5)
+        self.wait_until_ready(cached=_ready_cache.get(self.serial.port))
+        self.ready_latency = time.monotonic() - _start
 
 
-def main():
-    serial_com = Serial_communicator()
-    watchdog = time.time()
+class Ready_cache():
+    # ports that answered RDY, persisted so a restarted bridge knows the board is homed already
+    def __init__(self, path=READY_CACHE_PATH):
+        self.path = path
 
-    while True:
-        if (time.time() - watchdog) > 3600:
-            exit(0)
+    def _load(self):
+        try:
+            with open(self.path) as _file:
+                return json.load(_file)
+        except (OSError, ValueError):
+            return {}
 
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
-        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    def _store(self, ports):
+        try:
+            with open(self.path, 'w') as _file:
+                json.dump(ports, _file)
+        except OSError:
+            pass
 
-        if not serial_com.check_connection():
-            exit()
+    def get(self, port):
+        return port in self._load()
 
-        try:
-            client_socket.connect(('localhost', 65432))
-            print('✅ Socket connection established')
+    def __setitem__(self, port, timestamp):
+        _ports = self._load()
+        _ports[port] = timestamp
+        self._store(_ports)
+
+    def pop(self, port, default=None):
+        _ports = self._load()
+        _value = _ports.pop(port, default)
+        self._store(_ports)
+        return _value
+
+_ready_cache = Ready_cache()
+
+
+def split_sequence_markers(data):
+    # complete lines -> (lines without the markers, {'stream', 'index'} of the last marker or None)
+    if b'#' not in data:
+        return data, None
+    _lines = data.split(b'\n')[:-1]
+    _markers = [_line for _line in _lines if _line[:1] == b'#']
+    _stream, _, _index = _markers[-1][1:].partition(b':')
+    _commands = [_line for _line in _lines if _line[:1] != b'#']
+    try:
+        _sequence = {'stream': _stream.decode('utf-8'), 'index': int(_index)}
+    except ValueError:
+        _sequence = None
+    return b''.join(_line + b'\n' for _line in _commands), _sequence
+
+
+class Async_bridge():
+    # Forwards the socket to the UART and back with asyncio:
+    # socket -> newline framing -> inbound queue -> coalesced UART writes
+    # UART reader thread -> telemetry ring + telemetry clients (health port), other lines -> outbound queue -> socket
+    # Sequence markers of the API ('#<stream>:<index>' lines after a message) are stripped before the UART, the last
+    # one written is reported as status()['sequence'], so the API can resume a drawing after a dropped connection,
+    # and acknowledged to the API with an '@<stream>:<index>' line once the UART sent it at BAUD, which bounds the
+    # messages in flight, i.e. queued in the bridge or the serial driver (Serial_handler.window).
+    # 'abort <stream>' on the health port drops everything of that stream that is still queued, down to the UART driver.
+    # Both queues are bounded. A full inbound queue stops reading from the socket (backpressure to the API),
+    # a full outbound queue drops the oldest data, the write path never waits for the read path.
+    # idle_exit: seconds without an API connection until run() returns, 0 never returns while the port is fine
+    # health_port: localhost port answering every connection with one JSON line of status(), None disables it
+    def __init__(self, serial_com, transport=TRANSPORT, idle_exit=BRIDGE_IDLE_EXIT, health_port=BRIDGE_HEALTH_PORT):
+        self.serial_com = serial_com
+        self.transport = make_transport(transport)
+        self.idle_exit = idle_exit
+        self.health_port = health_port
+        self.uart_writer = ThreadPoolExecutor(max_workers=1) # one thread keeps the writes in order
+        self.started = time.monotonic()
+        self.watchdog = time.monotonic()
+        self.connected = False
+        self.connections = 0
+        self.loop = None
+        self.outbound = None
+        self.reading = threading.Event()
+        self.telemetry = Telemetry_ring()
+        self.telemetry_clients = set() # one asyncio.Queue of sample batches per client
+        self.sequence = None # {'stream', 'index'} of the last message written to the UART
+        self.aborted_stream = None
+        self.line_clock = 0.0 # estimated time.monotonic() when the UART sent the last byte written
+        self.inbound = None
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.outbound = asyncio.Queue(maxsize=BRIDGE_QUEUE_SIZE)
+        threading.Thread(target=self._read_uart, daemon=True).start()
+        asyncio.create_task(self._report())
+        if self.health_port is not None:
+            await asyncio.start_server(self._health, 'localhost', self.health_port, reuse_address=True)
+
+        _checked = 0
+        while True:
+            if self.idle_exit and (time.monotonic() - self.watchdog) > self.idle_exit:
+                return
+
+            if time.monotonic() - _checked > 1: # the probe is written to the board, not on every attach attempt
+                if not self.serial_com.check_connection():
+                    return
+                _checked = time.monotonic()
 
             try:
-                while True:
-                    data = client_socket.recv(1024)
-                    if not data:
-                        print('🔌 Socket disconnected.')
-                        client_socket.close()
-                        watchdog = time.time()
-                        break
+                reader, writer = await self.transport.open_bridge_connection()
+            except OSError:
+                await asyncio.sleep(BRIDGE_ATTACH_INTERVAL)
+                continue
 
-                    serial_com.handle_serial_commands(data)
+            print(f'✅ Socket connection established ({self.transport})')
+            self.serial_com.reset_connection_state()
+            self.connected = True
+            self.connections += 1
+            try:
+                await self._serve(reader, writer)
+            finally:
+                self.connected = False
+            print('🔌 Socket disconnected.')
+            print(f'📊 {self.serial_com.throughput.summary()}')
+            print(f'⏱️ {self.serial_com.pair_monitor.summary()}')
+            self.watchdog = time.monotonic()
 
+    async def _serve(self, reader, writer):
+        _inbound = asyncio.Queue(maxsize=BRIDGE_QUEUE_SIZE)
+        self.inbound = _inbound
+        _tasks = [asyncio.create_task(self._receive(reader, _inbound)),
+                  asyncio.create_task(self._write_uart(_inbound)),
+                  asyncio.create_task(self._send(writer))]
+        self.reading.set()
+        try:
+            try:
+                await _tasks[0] # connection closed by the API
             except Exception as e:
                 print(f'⚠️ Socket loop exception: {e}')
+            await _inbound.join() # write what is left
+        finally:
+            self.reading.clear()
+            for _task in _tasks:
+                _task.cancel()
+            writer.close()
+
+    async def _receive(self, reader, inbound):
+        _pending = b''
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            _pending += data
+            _end = _pending.rfind(b'\n') + 1
+            if _end:
+                await inbound.put(_pending[:_end])
+                _pending = _pending[_end:]
+
+    async def _write_uart(self, inbound):
+        while True:
+            _chunks = [await inbound.get()]
+            _size = len(_chunks[0])
+            while _size < BRIDGE_MAX_WRITE and not inbound.empty():
+                _chunks.append(inbound.get_nowait())
+                _size += len(_chunks[-1])
+            _data, _sequence = split_sequence_markers(b''.join(_chunks))
+            try:
+                if _sequence is not None and _sequence['stream'] == self.aborted_stream:
+                    continue
+                if _data:
+                    await self.loop.run_in_executor(self.uart_writer, self.serial_com.write_lines, _data)
+                # the driver takes the write at once, the message is on the wire when the UART sent everything before it
+                self.line_clock = max(self.line_clock, time.monotonic()) + len(_data) * 10 / BAUD
+                if _sequence is not None:
+                    self.sequence = _sequence
+                    self.loop.call_later(max(0.0, self.line_clock - time.monotonic()), self._put_outbound,
+                                         f'@{_sequence["stream"]}:{_sequence["index"]}\n'.encode('utf-8'))
+            except Exception as e:
+                print(f'⚠️ Serial write failed: {e}')
             finally:
-                client_socket.close()
+                for _ in _chunks:
+                    inbound.task_done()
 
-        except:
-            time.sleep(0.5)
+    async def _send(self, writer):
+        while True:
+            data = await self.outbound.get()
+            writer.write(data)
+            await writer.drain()
+
+    def _read_uart(self):
+        # runs in its own thread, pyserial reads block
+        # Drains the UART all the time, not only while the API is connected, so monitor output never piles up.
+        # Telemetry lines go into the ring and to the telemetry clients, the rest to the API if it is connected.
+        _pending = b''
+        while True:
+            try:
+                data = self.serial_com.read_available()
+            except Exception:
+                time.sleep(0.1)
+                continue
+            if not data:
+                continue
+            _timestamp = time.monotonic()
+            self.serial_com.throughput.read(data)
+            *_lines, _pending = (_pending + data).split(b'\n')
+            if not _lines:
+                continue
+            _samples, _other = parse_monitor_lines(_lines, _timestamp)
+            if len(_samples):
+                self.telemetry.extend(_samples)
+                self.loop.call_soon_threadsafe(self._publish_telemetry, _samples)
+            if _other and self.reading.is_set():
+                self.loop.call_soon_threadsafe(self._put_outbound, b'\n'.join(_other) + b'\n')
+
+    def _publish_telemetry(self, samples):
+        for _queue in self.telemetry_clients:
+            if _queue.full():
+                _queue.get_nowait()
+            _queue.put_nowait(samples)
+
+    def _put_outbound(self, data):
+        if self.outbound.full():
+            self.outbound.get_nowait()
+        self.outbound.put_nowait(data)
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'transport': str(self.transport),
+            'serial_port': self.serial_com.serial.port,
+            'ready': self.serial_com.ready,
+            'ready_latency': self.serial_com.ready_latency,
+            'connected': self.connected,
+            'connections': self.connections,
+            'uptime': time.monotonic() - self.started,
+            'idle': 0.0 if self.connected else time.monotonic() - self.watchdog,
+            'idle_exit': self.idle_exit,
+            'throughput': self.serial_com.throughput.summary(),
+            'sequence': self.sequence,
+            'telemetry_samples': self.telemetry.count,
+            'telemetry_clients': len(self.telemetry_clients),
+        }
+
+    async def _health(self, reader, writer):
+        # 'status' (or nothing within 0.5 s): one JSON line of status()
+        # 'telemetry <history>': the last history samples of the ring, then every new sample, as float64 records
+        try:
+            try:
+                _request = (await asyncio.wait_for(reader.readline(), 0.5)).split()
+            except asyncio.TimeoutError:
+                _request = []
+            if _request[:1] == [b'telemetry']:
+                await self._stream_telemetry(reader, writer, int(_request[1]) if len(_request) > 1 else 0)
+            else:
+                if _request[:1] == [b'abort'] and len(_request) > 1:
+                    self.abort(_request[1].decode('utf-8'))
+                writer.write(json.dumps(self.status()).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (OSError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def abort(self, stream):
+        # drops the queued messages of stream and what the UART driver has not sent yet, the motors hold the last
+        # target that reached the board
+        self.aborted_stream = stream
+        if self.inbound is not None:
+            while not self.inbound.empty():
+                self.inbound.get_nowait()
+                self.inbound.task_done()
+        try:
+            self.serial_com.serial.reset_output_buffer()
+        except Exception:
+            pass
+        print(f'⏹️ Aborted stream {stream}.')
+
+    async def _stream_telemetry(self, reader, writer, history):
+        # The client sends nothing after its request, a read that returns means it closed the connection. It is
+        # awaited together with the next batch, so a client is also dropped while no samples arrive.
+        _queue = asyncio.Queue(maxsize=TELEMETRY_QUEUE_SIZE)
+        self.telemetry_clients.add(_queue)
+        _closed = asyncio.ensure_future(reader.read(1))
+        _batch = None
+        try:
+            if history:
+                writer.write(encode_samples(self.telemetry.latest(history)))
+            while True:
+                _batch = asyncio.ensure_future(_queue.get())
+                await asyncio.wait((_batch, _closed), return_when=asyncio.FIRST_COMPLETED)
+                if _closed.done():
+                    return
+                writer.write(encode_samples(_batch.result()))
+                await writer.drain()
+        finally:
+            _closed.cancel()
+            if _batch is not None:
+                _batch.cancel()
+            self.telemetry_clients.discard(_queue)
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(BRIDGE_STATS_INTERVAL)
+            if self.reading.is_set() and self.serial_com.throughput.writes:
+                print(f'📊 {self.serial_com.throughput.summary()}')
+
+
+def main():
+    # python serial_com.py [tcp|unix|shm] [--port /dev/pts/3] [--idle-exit 0]
+    # further robots (devices.py) get their own --address, --health-port and --lock, see supervisor.start_bridge
+    parser = argparse.ArgumentParser()
+    parser.add_argument('transport', nargs='?', default=TRANSPORT)
+    parser.add_argument('--port', default=None, help='serial device, e.g. the port printed by virtual_robot.py')
+    parser.add_argument('--address', default=None, help='TCP port, socket path or shared memory name of the transport')
+    parser.add_argument('--idle-exit', type=float, default=BRIDGE_IDLE_EXIT, help='seconds without API connection until exit, 0 never')
+    parser.add_argument('--health-port', type=int, default=BRIDGE_HEALTH_PORT)
+    parser.add_argument('--lock', default=BRIDGE_LOCK_PATH)
+    args = parser.parse_args()
+
+    # one bridge per robot, a second one could not open the serial port or the API socket anyway
+    _lock = acquire_bridge_lock(args.lock)
+    if _lock is None:
+        print(f'⚠️ Another bridge is running (pid {bridge_pid(args.lock)}), exiting.')
+        return 1
+
+    serial_com = Serial_communicator(port=args.port)
+    _transport = make_transport(args.transport, args.address)
+    asyncio.run(Async_bridge(serial_com, _transport, idle_exit=args.idle_exit, health_port=args.health_port).run())
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,57 +1,371 @@
 import socket
 import time
+import queue
+import random
+import itertools
+import threading
+import collections
 from drawing_bot_api.config import *
+from drawing_bot_api.scheduler import Pacing_scheduler
+from drawing_bot_api.transport import make_transport
+from drawing_bot_api.supervisor import bridge_status
+
+_END_OF_STREAM = object()
 
 class Serial_handler:
 
-    def __init__(self):
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
-        self.server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-        self.server_socket.settimeout(20)
-        self.server_socket.bind(('localhost', 65432))
-        self.server_socket.listen()
+    def __init__(self, persistent=False, transport=TRANSPORT, health_port=BRIDGE_HEALTH_PORT, window=IN_FLIGHT_WINDOW):
+        # persistent: keep the accepted connection open between sends (see DrawingBot.session) and
+        #             reconnect if the bridge dropped it
+        # transport: name of a transport in transport.py or a transport object, the bridge has to use the same one
+        # health_port: of the bridge, asked for the last message it wrote when a paced send resumes
+        # window: messages a paced send may be ahead of the UART writes of the bridge, None for no limit
+        self.persistent = persistent
+        self.transport = make_transport(transport)
+        self.health_port = health_port
+        self.server_socket = self.transport.listen(timeout=20)
         self.conn = None
         self.addr = None
         self.buffer = []
+        self.last_sent = {} # last message sent per first character, holds the current target of both motors
+        self.messages_per_point = 2 # 1 when W and E are sent as one paired frame
+        self.period = SERIAL_DELAY # pacing slot of one message, a replayed artifact brings its own
+        self.stream = None # id of the current paced send, in the sequence markers
+        self.window = window
+        self.in_flight = collections.deque() # indices sent but not acknowledged by the bridge
+        self.unacknowledged = False # the bridge did not acknowledge during the current paced send, its window is off
+        self.incoming = b'' # incomplete line received from the bridge
+        # control of a running send, pause(), resume() and abort() are called from other threads
+        self.active = threading.Event()
+        self.running = threading.Event()
+        self.aborted = threading.Event()
+        self.progress = None # called with the index of every paced message after it was sent, e.g. for a progress bar
+        self.scheduler = Pacing_scheduler() # scheduler.report() has the timing of the last send
 
     def __init_connection(self):
+        if self.conn is not None:
+            if self.__connection_alive():
+                return
+            self.__close_connection()
+
         print("📡 Waiting for serial_com.py connection...")
         self.conn, self.addr = self.server_socket.accept()
         print('✅ Connected to serial script.')
 
-    def __disconnect(self):
+    def __connection_alive(self):
+        # a readable socket that returns no data was closed by the bridge (it may forward board output, that is peeked only)
+        try:
+            self.conn.setblocking(False)
+            return self.conn.recv(1, socket.MSG_PEEK) != b''
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            try:
+                self.conn.setblocking(True)
+            except OSError:
+                pass
+
+    def __close_connection(self):
         if self.conn is not None:
+            self.__drain_incoming() # closing with unread data resets the connection instead of closing it
             self.conn.close()
+        self.conn = None
+        self.last_sent = {}
 
-    def send_buffer(self, promting):
+    def __drain_incoming(self):
+        try:
+            self.conn.setblocking(False)
+            while self.conn.recv(65536):
+                pass
+        except OSError:
+            pass
+
+    def __disconnect(self):
+        # A handler without session() is used for one send. Its listening socket is closed as well, also after a
+        # declined prompt, an accept timeout or an error, DrawingBot keeps the handler for abort() and would hold the port.
+        if not self.persistent:
+            self.close()
+
+    def close(self):
+        self.__close_connection()
+        self.server_socket.close()
+
+    def __send(self, message, index=None):
+        # index: position in the paced send, followed by the sequence marker '#<stream>:<index>' in the same write,
+        #        a failed send then raises and __send_paced resumes
+        _data = message if isinstance(message, (bytes, bytearray, memoryview)) else str(message).encode('utf-8')
+        if not len(_data): # skipped command, only takes up its pacing slot
+            return
+        if index is not None:
+            self.conn.sendall(bytes(_data) + f'#{self.stream}:{index}\n'.encode('utf-8'))
+            self.in_flight.append(index)
+            self.last_sent[_data[0]] = _data
+            return
+        try:
+            self.conn.sendall(_data)
+        except Exception as e:
+            if not self.persistent:
+                print(f"⚠️ Failed to send: {e}")
+                return
+            print(f"⚠️ Failed to send: {e}, reconnecting...")
+            self.__close_connection()
+            self.__init_connection()
+            self.conn.sendall(_data)
+        self.last_sent[_data[0]] = _data
+
+    def __send_head(self, head, settle=True):
+        # Send the messages of the first point and wait for the robot to get there.
+        # The wait is 0.5 s at most and shrinks with the distance to the previous target when it is known.
+        _settle_time = self.__approach_time(head) if settle else 0
+        for message in head:
+            self.__send(message)
+        time.sleep(_settle_time)
+
+    def __approach_time(self, head, previous=None):
+        # previous: messages with the targets the robot is at, the last sent ones if None
+        try:
+            _previous = _targets(self.last_sent.values() if previous is None else previous)
+            _distance = max(abs(_value - _previous[_side]) for _side, _value in _targets(head).items())
+        except (KeyError, ValueError, IndexError, TypeError):
+            return 0.5
+        return min(0.5, _distance / MOTOR_VELOCITY_LIMIT)
+
+    def connect(self):
+        self.__init_connection()
+
+    def send_now(self, message):
+        # one message right away, without head, pacing or sequence marker (used by jog.py), reconnects if persistent
         self.__init_connection()
-        __time = self.millis()
+        self.__send(message)
+
+    def send_buffer(self, promting):
+        try:
+            return self.send_messages(self.buffer, promting)
+        finally:
+            self.buffer.clear()
+
+    def send_messages(self, messages, promting):
+        # Like send_buffer, for a sequence that is already complete (supports len() and repeated iteration),
+        # e.g. the Encoded_trajectory of a replayed artifact, which is sent without copying it into the buffer.
+        self.__begin()
+        try:
+            self.__init_connection()
+            self.__send_head(list(itertools.islice(messages, self.messages_per_point)), settle=len(messages) > self.messages_per_point)
+
+            if promting:
+                answer = input('Do you want to continue with this drawing? (y/n)\n')
+                if answer.lower() != 'y':
+                    return 1
+
+            return self.__send_paced(messages)
+        finally:
+            self.active.clear()
+            self.__disconnect()
 
-        # Send first two items (likely handshake/setup)
-        self.conn.sendall(str(self.buffer[0]).encode('utf-8'))
-        self.conn.sendall(str(self.buffer[1]).encode('utf-8'))
-        time.sleep(0.5)
+    def send_stream(self, messages, promting):
+        # Like send_buffer, but messages is an iterable that is consumed while it is being produced.
+        # A producer thread fills a bounded queue, so sampling, IK and encoding run concurrently with
+        # the paced send and at most STREAM_QUEUE_SIZE messages are held in memory.
+        # An exception of messages ends the stream after the messages before it and is raised here afterwards.
+        _queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        _stop = threading.Event()
+        _errors = []
 
-        if promting:
-            answer = input('Do you want to continue with this drawing? (y/n)\n')
-            if answer.lower() != 'y':
-                self.buffer.clear()
-                return 1
+        def _put(item):
+            while not _stop.is_set():
+                try:
+                    _queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
 
-        for message in self.buffer:
+        def _produce():
             try:
-                self.conn.sendall(str(message).encode('utf-8'))
+                for message in messages:
+                    if not _put(message):
+                        return
             except Exception as e:
-                print(f"⚠️ Failed to send: {e}")
+                _errors.append(e)
+            finally:
+                _put(_END_OF_STREAM)
+
+        _producer = threading.Thread(target=_produce, daemon=True)
+        _producer.start()
+
+        try:
+            self.__begin()
+            _head = []
+            _ended = False
+            while len(_head) < self.messages_per_point + 1: # look one message ahead to know if the stream is longer
+                message = _queue.get()
+                if message is _END_OF_STREAM:
+                    _ended = True
+                    break
+                _head.append(message)
+            if _errors and not _head: # the first chunk failed, raised before the bridge connection is accepted
+                raise _errors[0]
+
+            self.__init_connection()
+            self.__send_head(_head[:self.messages_per_point], settle=not _ended)
+
+            if promting:
+                answer = input('Do you want to continue with this drawing? (y/n)\n')
+                if answer.lower() != 'y':
+                    return 1
+
+            if _ended:
+                _result = self.__send_paced(_head)
+            else:
+                _result = self.__send_paced(itertools.chain(_head, iter(_queue.get, _END_OF_STREAM)))
+        finally:
+            _stop.set()
+            self.active.clear()
+            self.__disconnect()
+            _producer.join()
+
+        if _errors:
+            raise _errors[0]
+        return _result
+
+    def __begin(self):
+        self.stream = None
+        self.aborted.clear()
+        self.running.set()
+        self.active.set()
+
+    def pause(self):
+        # the robot stops at the target of the last message in flight (at most window messages after this call)
+        if self.active.is_set():
+            self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def abort(self):
+        # Stops the running send and tells the bridge to drop everything of it that is still queued, down to the UART
+        # driver. The motors hold the last target that reached the board. Returns False if nothing was running.
+        if not self.active.is_set():
+            return False
+        self.aborted.set()
+        self.running.set()
+        if self.stream is not None:
+            bridge_status(self.health_port, request=f'abort {self.stream}')
+        return True
 
-            __delay = SERIAL_DELAY - ((self.millis() - __time) / 1000)
-            time.sleep(max(__delay, 0))
-            __time = self.millis()
+    def __send_paced(self, messages):
+        # Every message carries its index, the last RESUME_HISTORY sent messages are kept. If the connection drops,
+        # the send resumes after the last message the bridge wrote to the UART (see __resume).
+        self.scheduler = Pacing_scheduler(period=self.period)
+        self.scheduler.start()
+        self.stream = f'{random.getrandbits(32):08x}'
+        self.in_flight.clear()
+        self.unacknowledged = False
+        _history = collections.deque(maxlen=RESUME_HISTORY)
+        _messages = enumerate(messages)
 
-        self.buffer.clear()
-        self.__disconnect()
+        while True:
+            for _index, message in _messages:
+                if not self.running.is_set():
+                    self.__wait_while_paused()
+                if self.aborted.is_set():
+                    print('⏹️ Drawing aborted.')
+                    return 1
+                self.__wait_for_window()
+                self.scheduler.wait()
+                _history.append((_index, message))
+                try:
+                    self.__send(message, _index)
+                except OSError as e:
+                    _messages = self.__resume(_history, _messages, e)
+                    break
+                if self.progress is not None:
+                    self.progress(_index)
+            else:
+                return
+
+    def __wait_while_paused(self):
+        _paused = time.monotonic()
+        print('⏸️ Drawing paused.')
+        self.running.wait()
+        self.scheduler.shift += time.monotonic() - _paused
+        if not self.aborted.is_set():
+            print('▶️ Drawing resumed.')
+
+    def __wait_for_window(self):
+        # Blocks while window messages are in flight, i.e. sent but not yet written to the UART by the bridge.
+        # Without acknowledgements (older bridge) only the current send goes on without the limit, the next one tries again.
+        if self.window is None or self.unacknowledged or len(self.in_flight) < self.window:
+            return
+        _deadline = time.monotonic() + 1
+        while True:
+            self.__read_acknowledgements()
+            if len(self.in_flight) < self.window or self.aborted.is_set():
+                return
+            if time.monotonic() > _deadline:
+                print('⚠️ The bridge does not acknowledge messages, sending this drawing without in-flight limit.')
+                self.unacknowledged = True
+                return
+            time.sleep(self.period / 10)
+
+    def __read_acknowledgements(self):
+        # drains what the bridge sent back without blocking and drops the indices it acknowledged with '@<stream>:<index>'
+        try:
+            self.conn.setblocking(False)
+            while True:
+                data = self.conn.recv(65536)
+                if not data:
+                    break
+                self.incoming += data
+        except OSError: # includes BlockingIOError, nothing left to read
+            pass
+        finally:
+            try:
+                self.conn.setblocking(True)
+            except OSError:
+                pass
+        *_lines, self.incoming = self.incoming.split(b'\n')
+        _prefix = f'@{self.stream}:'.encode('utf-8')
+        for _line in reversed(_lines):
+            if _line.startswith(_prefix):
+                _acknowledged = int(_line[len(_prefix):])
+                while self.in_flight and self.in_flight[0] <= _acknowledged:
+                    self.in_flight.popleft()
+                return
+
+    def __resume(self, history, remaining, error):
+        # Reconnects, asks the bridge for the last index it wrote and returns the messages to send from there on,
+        # after an approach move to the first of them. Without an answer of the bridge every message in history is
+        # sent again, the pen then retraces a part of the drawing instead of leaving a gap.
+        print(f'⚠️ Failed to send: {error}, reconnecting...')
+        self.__close_connection()
+        self.__init_connection()
+
+        _status = bridge_status(self.health_port)
+        _sequence = _status.get('sequence') if _status is not None else None
+        _written = _sequence['index'] if _sequence is not None and _sequence['stream'] == self.stream else None
+        if _written is None:
+            print(f'⚠️ The bridge did not report its progress, resuming {len(history)} messages back.')
+        elif history and history[0][0] > _written + 1:
+            print(f'⚠️ The bridge wrote up to message {_written}, only messages from {history[0][0]} on are kept. '
+                  f'Increase RESUME_HISTORY to avoid this gap.')
+        _pending = [(_index, message) for _index, message in history if _written is None or _index > _written]
+        _done = [message for _index, message in history if _written is not None and _index <= _written]
+        history.clear()
+        self.in_flight.clear()
+        if not _pending:
+            return remaining
+        print(f'🔁 Resuming at message {_pending[0][0]}.')
+
+        _head = [message for _index, message in _pending[:self.messages_per_point]]
+        _settle_time = self.__approach_time(_head, _done[-self.messages_per_point:] if _done else None)
+        for message in _head:
+            self.__send(message)
+        time.sleep(_settle_time)
+        self.scheduler.shift += max(0.0, time.monotonic() - self.scheduler.deadline()) # the pause is not made up for
+        return itertools.chain(_pending, remaining)
 
     def millis(self):
         return time.time() * 1000
@@ -59,6 +373,22 @@ class Serial_handler:
     def __call__(self, message):
         self.buffer.append(message)
 
+    def extend(self, messages):
+        self.buffer.extend(messages)
+
+def _message_text(message):
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        return bytes(message).decode('utf-8')
+    return str(message)
+
+# motor targets in messages as {side: value}, later messages win
+def _targets(messages):
+    _result = {}
+    for message in messages:
+        for _line in _message_text(message).split():
+            _result[_line[0]] = float(_line[1:])
+    return _result
+
 if __name__ == '__main__':
     serial_handler = Serial_handler()
     serial_handler.__init_connection()
\ No newline at end of file
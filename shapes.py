@@ -1,4 +1,5 @@
 from math import sin, cos, pi, sqrt, pow, asin, atan2
+import numpy as np
 import matplotlib.pyplot as plt
 from drawing_bot_api.config import *
 
@@ -12,6 +13,13 @@ class Line:
         x = self.start_point[0] + ( (self.end_point[0] - self.start_point[0]) * t)
         y = self.start_point[1] + ( (self.end_point[1] - self.start_point[1]) * t)
         return [x, y]
+
+    def get_points(self, t): # vectorized get_point, t is an array of parameters, returns an (N, 2) array
+        t = np.asarray(t, dtype=float)
+        _points = np.empty((t.size, 2))
+        _points[:, 0] = self.start_point[0] + ( (self.end_point[0] - self.start_point[0]) * t)
+        _points[:, 1] = self.start_point[1] + ( (self.end_point[1] - self.start_point[1]) * t)
+        return _points
     
     def plot(self, color=SHAPE_COLOR, label=None, resolution=PLOTTING_RESOLUTION):
         sample_number = int(resolution * self.circumference)
@@ -31,6 +39,13 @@ class Circle:
         x = cos(2 * pi * t) * self.radius + self.center_point[0]
         y = sin(2 * pi * t) * self.radius + self.center_point[1]
         return [x, y]
+
+    def get_points(self, t):
+        t = np.asarray(t, dtype=float)
+        _points = np.empty((t.size, 2))
+        _points[:, 0] = np.cos(2 * pi * t) * self.radius + self.center_point[0]
+        _points[:, 1] = np.sin(2 * pi * t) * self.radius + self.center_point[1]
+        return _points
     
     def plot(self, color=SHAPE_COLOR, label=None, resolution=PLOTTING_RESOLUTION):
         sample_number = int(resolution * self.circumference)
@@ -76,6 +91,13 @@ class PartialCircle:
         x = self.radius * cos(self.offset + (t * self.direction * self.section_angle)) + self.center_point[0]
         y = self.radius * sin(self.offset + (t * self.direction * self.section_angle)) + self.center_point[1]
         return [x, y]
+
+    def get_points(self, t):
+        _angles = self.offset + (np.asarray(t, dtype=float) * self.direction * self.section_angle)
+        _points = np.empty((_angles.size, 2))
+        _points[:, 0] = self.radius * np.cos(_angles) + self.center_point[0]
+        _points[:, 1] = self.radius * np.sin(_angles) + self.center_point[1]
+        return _points
     
     def plot(self, color=SHAPE_COLOR, label=None, resolution=PLOTTING_RESOLUTION):
         sample_number = int(resolution * self.circumference)
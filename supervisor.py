@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import json
+import signal
+import socket
+import argparse
+import subprocess
+from pathlib import Path
+from drawing_bot_api.config import *
+from drawing_bot_api.devices import Device, DEFAULT_DEVICE, get_device
+
+try:
+    import fcntl
+except ImportError: # Windows, only the health check keeps a second bridge from starting
+    fcntl = None
+
+# Keeps one serial bridge (serial_com.py) warm for all scripts of the machine:
+# - the running bridge holds an exclusive lock on BRIDGE_LOCK_PATH, which also holds its pid
+# - it answers on localhost:BRIDGE_HEALTH_PORT with one JSON line of its state
+# - ensure_bridge_running() attaches to that bridge or starts one that does not exit when idle
+# Every device of devices.py has its own bridge, lock file and health port, pass device= (a name or a Device).
+# python supervisor.py [start|status|stop|watch] [tcp|unix|shm] [--port /dev/ttyUSB0] [--device NAME]
+
+#################################
+# Lock
+#################################
+
+def acquire_bridge_lock(path=BRIDGE_LOCK_PATH):
+    # returns the open lock file, keep it open as long as the bridge runs, None if another process holds it
+    _file = open(path, 'a+')
+    if fcntl is not None:
+        try:
+            fcntl.flock(_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            _file.close()
+            return None
+    _file.seek(0)
+    _file.truncate()
+    _file.write(f'{os.getpid()}\n')
+    _file.flush()
+    return _file
+
+def bridge_lock_held(path=BRIDGE_LOCK_PATH):
+    if fcntl is None or not os.path.exists(path):
+        return False
+    with open(path, 'a+') as _file:
+        try:
+            fcntl.flock(_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(_file, fcntl.LOCK_UN)
+        return False
+
+def bridge_pid(path=BRIDGE_LOCK_PATH):
+    # pid of the bridge holding the lock, None if no bridge runs
+    if not bridge_lock_held(path):
+        return None
+    try:
+        with open(path) as _file:
+            return int(_file.read().strip())
+    except (OSError, ValueError):
+        return None
+
+#################################
+# Health check
+#################################
+
+def bridge_status(port=BRIDGE_HEALTH_PORT, timeout=0.2, request='status'):
+    # state of the running bridge as a dict (see Async_bridge.status), None if no bridge answers
+    # request: 'abort <stream>' aborts a running paced send first (see Serial_handler.abort)
+    try:
+        with socket.create_connection(('localhost', port), timeout=timeout) as _connection:
+            _connection.sendall(f'{request}\n'.encode('utf-8'))
+            _data = b''
+            while not _data.endswith(b'\n'):
+                _chunk = _connection.recv(4096)
+                if not _chunk:
+                    break
+                _data += _chunk
+        return json.loads(_data)
+    except (OSError, ValueError):
+        return None
+
+#################################
+# Start / stop
+#################################
+
+def _device(device=None, port=None, transport=TRANSPORT):
+    return get_device(device) if device is not None else Device(DEFAULT_DEVICE, serial_port=port, transport=transport)
+
+def bridge_log_path(device=None):
+    # every bridge logs into its own file, so the bridges of several devices do not interleave
+    return BRIDGE_LOG_PATH.format(_device(device).health_port)
+
+def start_bridge(port=None, transport=TRANSPORT, idle_exit=0, device=None):
+    # detached from this process, so the bridge stays warm after the script exits, transport is a name from transport.py
+    _bridge = _device(device, port, transport)
+    _command = [sys.executable, '-m', 'drawing_bot_api.serial_com.serial_com', _bridge.transport, '--idle-exit', str(idle_exit),
+                '--health-port', str(_bridge.health_port), '--lock', _bridge.lock_path]
+    if _bridge.address is not None:
+        _command += ['--address', str(_bridge.address)]
+    if _bridge.serial_port is not None:
+        _command += ['--port', _bridge.serial_port]
+    with open(bridge_log_path(_bridge), 'a') as _log:
+        return subprocess.Popen(_command, cwd=str(Path(os.path.abspath(__file__)).parent.parent), # so -m finds drawing_bot_api
+                                stdin=subprocess.DEVNULL, stdout=_log, stderr=subprocess.STDOUT, start_new_session=True)
+
+def ensure_bridge_running(port=None, transport=TRANSPORT, timeout=BRIDGE_START_TIMEOUT, device=None):
+    # Returns the status of the running bridge, starts one if there is none.
+    # An existing bridge answers within milliseconds, a new one once it opened the serial port and the board is ready.
+    # None if no bridge reported within timeout, the API then still waits for one in Serial_handler.
+    _bridge = _device(device, port, transport)
+    status = bridge_status(_bridge.health_port)
+    if status is not None:
+        _check_transport(status, _bridge)
+        return status
+
+    _process = None
+    if bridge_lock_held(_bridge.lock_path):
+        print(f'[INFO] serial_com is starting (pid {bridge_pid(_bridge.lock_path)}), waiting for it.')
+    else:
+        try:
+            _process = start_bridge(device=_bridge)
+        except Exception as e:
+            print(f'[ERROR] Could not start serial_com: {e}')
+            return None
+        print(f'[INFO] serial_com started in background (pid {_process.pid}, log {bridge_log_path(_bridge)}).')
+
+    _deadline = time.monotonic() + timeout
+    while time.monotonic() < _deadline:
+        status = bridge_status(_bridge.health_port)
+        if status is not None:
+            _check_transport(status, _bridge)
+            return status
+        if _process is not None and _process.poll() is not None:
+            if bridge_lock_held(_bridge.lock_path): # lost the race against another script, wait for that bridge
+                _process = None
+                continue
+            print(f'[ERROR] serial_com exited with code {_process.returncode}, see {bridge_log_path(_bridge)}')
+            return None
+        time.sleep(0.05)
+
+    print(f'[WARN] serial_com did not report within {timeout} s, see {bridge_log_path(_bridge)}')
+    return None
+
+def _check_transport(status, device):
+    if status.get('transport') != str(device.make_transport()):
+        print(f'[WARN] The running bridge uses {status.get("transport")}, not {device.make_transport()}. '
+              f'Stop it with: python supervisor.py stop --device {device.name}')
+
+def stop_bridge(timeout=5, device=None):
+    _lock_path = _device(device).lock_path
+    _pid = bridge_pid(_lock_path)
+    if _pid is None:
+        return False
+    os.kill(_pid, signal.SIGTERM)
+    _deadline = time.monotonic() + timeout
+    while bridge_lock_held(_lock_path) and time.monotonic() < _deadline:
+        time.sleep(0.05)
+    return True
+
+def watch(port=None, transport=TRANSPORT, interval=BRIDGE_SUPERVISE_INTERVAL, device=None):
+    # restarts the bridge whenever it exits, e.g. after the serial connection was lost
+    while True:
+        ensure_bridge_running(port, transport, device=device)
+        time.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', nargs='?', default='start', choices=('start', 'status', 'stop', 'watch'))
+    parser.add_argument('transport', nargs='?', default=TRANSPORT)
+    parser.add_argument('--port', default=None, help='serial device, e.g. the port printed by virtual_robot.py')
+    parser.add_argument('--device', default=None, help='name of a device of devices.py, replaces transport and --port')
+    args = parser.parse_args()
+    _bridge = _device(args.device, args.port, args.transport)
+
+    if args.command == 'start':
+        return 0 if ensure_bridge_running(device=_bridge) is not None else 1
+    if args.command == 'status':
+        status = bridge_status(_bridge.health_port)
+        if status is None:
+            print('No bridge is running.' if not bridge_lock_held(_bridge.lock_path) else f'Bridge {bridge_pid(_bridge.lock_path)} is starting.')
+            return 1
+        print(json.dumps(status, indent=2))
+        return 0
+    if args.command == 'stop':
+        if not stop_bridge(device=_bridge):
+            print('No bridge is running.')
+        return 0
+    try:
+        watch(device=_bridge)
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import socket
+import threading
+import numpy as np
+from drawing_bot_api.config import *
+
+# Motor telemetry printed by the board, parsed by the bridge and streamed to the API.
+# A sample is one row (time, axis, target, velocity, angle):
+#   time   time.monotonic() of the bridge when the line was read, the same clock as in every process of the machine
+#   axis   0 for W (left motor), 1 for E (right motor)
+#   values motor side (GEAR_RATIO * joint angle) as printed by the firmware, nan if not monitored
+# Recognised lines:
+#   SimpleFOC monitor output, tab separated values in the order of MONITOR_VARIABLES, of the motor MONITOR_AXIS
+#   the same prefixed with W or E for firmwares that monitor both motors
+#   the debug print of the firmware loop: 'Left | Precision angle: 1.23<tab>Angle and Rotations: 4.56'
+TELEMETRY_FIELDS = ('time', 'axis', 'target', 'velocity', 'angle')
+_RECORD_SIZE = 8 * len(TELEMETRY_FIELDS) # bytes of one sample on the wire, little endian float64
+_AXES = {b'W': 0, b'E': 1, b'Left': 0, b'Right': 1}
+_COLUMNS = {_name: TELEMETRY_FIELDS.index(_name) for _name in ('target', 'velocity', 'angle')}
+
+class Telemetry_ring:
+    # Fixed size ring of samples. extend() is called by one thread, readers get copies under the lock.
+    def __init__(self, size=TELEMETRY_BUFFER_SIZE):
+        self.samples = np.full((size, len(TELEMETRY_FIELDS)), np.nan)
+        self.count = 0 # samples written since the start, the newest is at (count - 1) % size
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, len(self.samples))
+
+    def extend(self, samples):
+        _samples = np.asarray(samples, dtype=float).reshape(-1, len(TELEMETRY_FIELDS))[-len(self.samples):]
+        _size = len(self.samples)
+        with self.lock:
+            _index = (self.count + np.arange(len(_samples))) % _size
+            self.samples[_index] = _samples
+            self.count += len(_samples)
+
+    def latest(self, n=None):
+        # the last n samples (all if None), oldest first
+        with self.lock:
+            _n = len(self) if n is None else min(n, len(self))
+            _index = (self.count - _n + np.arange(_n)) % len(self.samples)
+            return self.samples[_index]
+
+    def since(self, timestamp):
+        _samples = self.latest()
+        return _samples[_samples[:, 0] >= timestamp]
+
+def parse_monitor_lines(lines, timestamp, axis=MONITOR_AXIS, variables=MONITOR_VARIABLES):
+    # lines: complete lines without the newline, as bytes
+    # returns (samples (M, 5), lines that are no telemetry)
+    samples = []
+    other = []
+    for _line in lines:
+        _sample = _parse_line(_line.strip(), timestamp, axis, variables)
+        if _sample is None:
+            other.append(_line)
+        else:
+            samples.append(_sample)
+    return np.array(samples, dtype=float).reshape(-1, len(TELEMETRY_FIELDS)), other
+
+def _parse_line(line, timestamp, axis, variables):
+    _sample = [timestamp, axis, np.nan, np.nan, np.nan]
+    if b'|' in line: # debug print of the firmware loop
+        _name, _, _rest = line.partition(b'|')
+        if _name.strip() not in _AXES or b'Angle and Rotations:' not in _rest:
+            return None
+        try:
+            _sample[1] = _AXES[_name.strip()]
+            _sample[_COLUMNS['angle']] = float(_rest.rpartition(b':')[2])
+        except ValueError:
+            return None
+        return _sample
+
+    if line[:1] in (b'W', b'E'):
+        _sample[1] = _AXES[line[:1]]
+        line = line[1:]
+    _values = line.split(b'\t')
+    if len(_values) != len(variables):
+        return None
+    try:
+        for _name, _value in zip(variables, _values):
+            _sample[_COLUMNS[_name]] = float(_value)
+    except ValueError:
+        return None
+    return _sample
+
+def encode_samples(samples):
+    return np.ascontiguousarray(samples, dtype='<f8').tobytes()
+
+class Telemetry_client:
+    # Subscribes to the telemetry of a running bridge (its health port, see supervisor.py) and keeps the samples
+    # in its own Telemetry_ring, filled by a background thread. The drawing itself is not affected, the bridge
+    # drops samples for a client that reads too slowly.
+    # with Telemetry_client() as telemetry:
+    #     drawing_bot.execute(promting=False)
+    #     print(telemetry.latest(100))
+    def __init__(self, health_port=BRIDGE_HEALTH_PORT, history=0, size=TELEMETRY_BUFFER_SIZE):
+        # history: samples the bridge already has that are sent first
+        self.health_port = health_port
+        self.history = history
+        self.ring = Telemetry_ring(size)
+        self.connection = None
+        self.thread = None
+
+    def start(self):
+        self.connection = socket.create_connection(('localhost', self.health_port), timeout=2)
+        self.connection.settimeout(None)
+        self.connection.sendall(f'telemetry {self.history}\n'.encode('utf-8'))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.connection is not None:
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR) # wakes the blocking recv of the thread
+            except OSError:
+                pass
+            self.thread.join()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self if self.connection is not None else self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run(self):
+        _pending = b''
+        while True:
+            try:
+                data = self.connection.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            _pending += data
+            _end = len(_pending) - len(_pending) % _RECORD_SIZE
+            if _end:
+                self.ring.extend(np.frombuffer(_pending[:_end], dtype='<f8'))
+                _pending = _pending[_end:]
+
+    def latest(self, n=None):
+        return self.ring.latest(n)
+
+    def since(self, timestamp):
+        return self.ring.since(timestamp)
+
+    def compare(self, command_times, targets, since=None):
+        # Measured angle minus the commanded target that was active at every sample (zero-order hold).
+        # command_times: (N,) send times on the monotonic clock, targets: (N, 2) motor angles [W, E], nan keeps the
+        # previous target of that axis, e.g. Serial_handler.scheduler.start_time + np.arange(N) * SERIAL_DELAY and
+        # the targets parsed from DrawingBot.command_stream(). The comparison includes the transport and UART delay.
+        # returns {axis: (sample times, errors)} for the axes with angle samples after the first command
+        _samples = self.since(command_times[0] if since is None else since)
+        _targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+        result = {}
+        for _axis in range(2):
+            _rows = _samples[(_samples[:, 1] == _axis) & ~np.isnan(_samples[:, _COLUMNS['angle']])]
+            _valid = ~np.isnan(_targets[:, _axis])
+            if not len(_rows) or not _valid.any():
+                continue
+            _times = np.asarray(command_times)[_valid]
+            _active = np.searchsorted(_times, _rows[:, 0], side='right') - 1
+            _rows, _active = _rows[_active >= 0], _active[_active >= 0]
+            result[_axis] = (_rows[:, 0], _rows[:, _COLUMNS['angle']] - _targets[_valid, _axis][_active])
+        return result
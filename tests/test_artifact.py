@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+from drawing_bot_api import DrawingBot, shapes
+from drawing_bot_api.devices import Device
+from drawing_bot_api.artifact import Trajectory_artifact, KIND_FRAMES, KIND_ANGLES, geometry_hash
+
+def _bot(**kwargs):
+    bot = DrawingBot(verbose=0, **kwargs)
+    bot.add_shape(shapes.Circle([0, 100], 20))
+    bot.add_shape(shapes.Line([20, 100], [-20, 80]))
+    return bot
+
+@pytest.mark.parametrize('kwargs', [{}, {'paired_frames': True}, {'dedup': True}, {'compact_encoding': False}])
+def test_frames_replay_the_command_stream(tmp_path, kwargs):
+    bot = _bot(**kwargs)
+    _path = bot.compile(tmp_path / 'drawing.trj')
+    artifact = Trajectory_artifact.load(_path)
+    assert artifact.kind == KIND_FRAMES
+    assert artifact.geometry == geometry_hash()
+    assert artifact.messages_per_point() == (1 if bot.paired_frames else 2)
+    _expected = [bytes(message) if not isinstance(message, str) else message.encode('utf-8') for message in bot.command_stream()]
+    assert [bytes(message) for message in artifact.messages()] == _expected
+    assert len(bot.shapes) == 2 # compile keeps the shapes
+
+def test_angles_are_encoded_on_load(tmp_path):
+    bot = _bot()
+    artifact = Trajectory_artifact.load(bot.compile(tmp_path / 'drawing.trj', store_angles=True))
+    assert artifact.kind == KIND_ANGLES
+    np.testing.assert_allclose(artifact.angles, bot.preflight().angles, atol=1e-6) # float32
+    assert len(artifact.messages()) == len(artifact) == 2 * len(artifact.angles)
+
+def test_load_refuses_other_files(tmp_path):
+    _path = _bot().compile(tmp_path / 'drawing.trj')
+    _data = _path.read_bytes()
+    for _name, _content, _message in (('short.trj', b'DBOT', 'not a trajectory'),
+                                      ('magic.trj', b'X' * 8 + _data[8:], 'not a trajectory'),
+                                      ('version.trj', _data[:8] + b'\xff\xff' + _data[10:], 'artifact version'),
+                                      ('truncated.trj', _data[:-10], 'truncated')):
+        (tmp_path / _name).write_bytes(_content)
+        with pytest.raises(ValueError, match=_message):
+            Trajectory_artifact.load(tmp_path / _name)
+
+def test_replay_refuses_other_geometry(tmp_path):
+    _path = _bot().compile(tmp_path / 'drawing.trj')
+    bot = DrawingBot(verbose=0, device=Device('other', geometry=[0.07, 0.13, 0.065]))
+    assert bot.replay(_path, promting=False) == 1 # before any bridge connection
@@ -0,0 +1,24 @@
+import pytest
+from drawing_bot_api import DrawingBot, shapes
+from drawing_bot_api.digital_twin import Digital_twin
+from drawing_bot_api.preflight import Preflight_error
+
+def test_command_stream_without_shapes():
+    with pytest.raises(ValueError, match='shapes empty'):
+        DrawingBot(verbose=0).command_stream()
+
+def test_simulate_bot_without_shapes():
+    with pytest.raises(ValueError, match='shapes empty'):
+        Digital_twin().simulate_bot(DrawingBot(verbose=0))
+
+def test_command_stream_sends_one_message_per_motor_and_point():
+    bot = DrawingBot(verbose=0)
+    bot.add_shape(shapes.Line([0, 100], [20, 100]))
+    _messages = bot.command_stream()
+    assert len(_messages) % 2 == 0
+    assert all(bytes(message)[:1] in (b'W', b'E') for message in _messages if len(bytes(message)))
+
+def test_move_to_unreachable_point_raises():
+    with pytest.raises(Preflight_error) as error:
+        DrawingBot(verbose=0).move_to_point([0, 500])
+    assert error.value.report.issues[0]['reason'] == 'unreachable'
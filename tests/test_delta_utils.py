@@ -0,0 +1,57 @@
+import numpy as np
+from drawing_bot_api import delta_utils
+from drawing_bot_api.delta_utils import ik_delta, ik_delta_batch, fk_delta, fk_delta_batch, jacobian_batch
+
+# the batched kinematics against the scalar functions they replace, positions in meters
+
+def _domain_grid():
+    _x, _y = np.meshgrid(np.linspace(-0.07, 0.07, 15), np.linspace(0.07, 0.12, 11))
+    return np.stack([_x.ravel(), _y.ravel()], axis=1)
+
+def test_ik_delta_batch_matches_ik_delta():
+    _positions = _domain_grid()
+    _angles, _reachable = ik_delta_batch(_positions)
+    assert _reachable.all()
+    np.testing.assert_allclose(_angles, [ik_delta(p) for p in _positions], atol=1e-12)
+
+def test_ik_delta_batch_units():
+    _angles_mm, _ = ik_delta_batch(_domain_grid() * 1000, unit=1000)
+    np.testing.assert_allclose(_angles_mm, ik_delta_batch(_domain_grid())[0], atol=1e-12)
+
+def test_ik_delta_batch_marks_unreachable_positions():
+    _angles, _reachable = ik_delta_batch([[0, 0.1], [0, 0.5], [0.3, 0]])
+    assert _reachable.tolist() == [True, False, False]
+    assert np.isnan(_angles[1:]).all()
+
+def test_ik_delta_batch_geometry():
+    _geometry = (0.08, 0.15, 0.05)
+    _angles, _reachable = ik_delta_batch(_domain_grid(), geometry=_geometry)
+    _l1, _l2, _d = _geometry
+    # both elbows are l2 away from the end-effector
+    for _side, _base in ((0, -_d), (1, _d)):
+        _elbow = np.stack([_base + _l1 * np.cos(_angles[:, _side]), _l1 * np.sin(_angles[:, _side])], axis=1)
+        np.testing.assert_allclose(np.hypot(*(_domain_grid() - _elbow).T), _l2, atol=1e-12)
+    assert _reachable.all()
+    assert delta_utils.lengths(_geometry) == _geometry
+
+def test_fk_delta_batch_matches_fk_delta():
+    _angles, _ = ik_delta_batch(_domain_grid())
+    _positions, _valid = fk_delta_batch(_angles)
+    assert _valid.all()
+    np.testing.assert_allclose(_positions, [fk_delta(q) for q in _angles], atol=1e-12)
+    np.testing.assert_allclose(_positions, _domain_grid(), atol=1e-12)
+
+def test_fk_delta_batch_marks_invalid_configurations():
+    # elbows further apart than two distal links, not possible with the default geometry
+    _positions, _valid = fk_delta_batch([[np.pi, 0]], geometry=(0.06, 0.05, 0.065))
+    assert not _valid[0]
+    assert np.isnan(_positions).all()
+
+def test_jacobian_batch_matches_finite_differences():
+    _angles, _ = ik_delta_batch(_domain_grid())
+    _jacobian, _condition = jacobian_batch(_angles)
+    _step = 1e-7
+    for q, jacobian in zip(_angles, _jacobian):
+        _numeric = np.stack([(fk_delta(q + _step * e) - fk_delta(q - _step * e)) / (2 * _step) for e in np.eye(2)], axis=1)
+        np.testing.assert_allclose(jacobian, _numeric, atol=1e-6)
+    assert np.isfinite(_condition).all() and (_condition >= 1).all()
@@ -0,0 +1,64 @@
+import numpy as np
+from drawing_bot_api.config import GEAR_RATIO
+from drawing_bot_api.encoding import encode_angles, encoder_decimals, dedup_mask
+
+def _decode(encoded):
+    # (N, 2) motor angles of W/E message pairs
+    _values = {}
+    for _index, message in enumerate(encoded):
+        _text = bytes(message).decode('ascii')
+        assert _text.endswith('\n') and _text.count('\n') == 1
+        _values[(_index // 2, 'WE'.index(_text[0]))] = float(_text[1:])
+    _angles = np.full((len(encoded) // 2, 2), np.nan)
+    for (_row, _side), _value in _values.items():
+        _angles[_row, _side] = _value
+    return _angles
+
+def test_round_trip():
+    _angles = np.random.default_rng(0).uniform(-4, 4, (500, 2))
+    for _decimals in (0, 2, 4):
+        _encoded = encode_angles(_angles, _decimals)
+        assert len(_encoded) == 2 * len(_angles)
+        np.testing.assert_allclose(_decode(_encoded), GEAR_RATIO * _angles, atol=0.5 * 10 ** -_decimals + 1e-12)
+
+def test_format_matches_python_formatting():
+    _angles = np.array([[0.0, 1.0], [-1.5, 12.25], [1e-9, -1e-9]]) / GEAR_RATIO
+    _messages = [bytes(message) for message in encode_angles(_angles, 3)]
+    assert _messages == [b'W0.000\n', b'E1.000\n', b'W-1.500\n', b'E12.250\n', b'W0.000\n', b'E0.000\n']
+
+def test_messages_slice_one_buffer():
+    _encoded = encode_angles(np.zeros((3, 2)), 1)
+    assert bytes(_encoded.data) == b''.join(bytes(message) for message in _encoded)
+    assert [bytes(_encoded[i]) for i in range(len(_encoded))] == [bytes(message) for message in _encoded]
+
+def test_paired_joins_both_motors():
+    _encoded = encode_angles([[0.1, 0.2], [0.3, 0.4]], 2)
+    _paired = _encoded.paired()
+    assert len(_paired) == 2
+    assert [bytes(message) for message in _paired] == [bytes(_encoded[0]) + bytes(_encoded[1]), bytes(_encoded[2]) + bytes(_encoded[3])]
+
+def test_encoder_decimals():
+    assert encoder_decimals(0.001) == 3
+    assert encoder_decimals(0.0015) == 3
+    assert encoder_decimals(1) == 0
+
+def test_dedup_keeps_held_target_within_threshold():
+    _threshold = 0.01
+    _angles = np.cumsum(np.random.default_rng(1).normal(0, 0.0005, (2000, 2)), axis=0)
+    _mask = dedup_mask(_angles, _threshold, keep_alive=50)
+    assert _mask[0].all() and _mask[-1].all() and _mask[::50].all()
+    assert _mask.mean() < 0.5
+    for _side in range(2):
+        _sent = np.flatnonzero(_mask[:, _side])
+        _held = GEAR_RATIO * _angles[_sent[np.searchsorted(_sent, np.arange(len(_angles)), side='right') - 1], _side]
+        assert np.abs(_held - GEAR_RATIO * _angles[:, _side]).max() < _threshold
+
+def test_dropped_commands_keep_their_slot():
+    _angles = np.zeros((10, 2))
+    _mask = dedup_mask(_angles, keep_alive=4)
+    _encoded = encode_angles(_angles, 3, send_mask=_mask)
+    assert len(_encoded) == 20
+    _lengths = [len(bytes(message)) for message in _encoded]
+    assert [_length > 0 for _length in _lengths] == _mask.ravel().tolist()
+    assert _encoded.saved_bytes == len(b'W0.000\n') * int((~_mask).sum())
+    assert _encoded.bandwidth()['saved_bytes'] == _encoded.saved_bytes
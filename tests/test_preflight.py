@@ -0,0 +1,36 @@
+import numpy as np
+from drawing_bot_api.preflight import preflight, in_domain, REASON_DOMAIN, REASON_UNREACHABLE
+
+# points in mm unless unit says otherwise
+
+def test_in_domain_box_and_dome():
+    _points = [[0, 100], [-70, 70], [70, 120], [0, 150], [0, 60], [80, 100], [60, 160]]
+    assert in_domain(_points).tolist() == [True, True, True, True, False, False, False]
+
+def test_in_domain_units():
+    assert in_domain([[0, 0.1], [0, 0.06]], unit=1).tolist() == [True, False]
+    assert in_domain([[0, 10]], unit=100).tolist() == [True]
+
+def test_preflight_passes_inside_domain():
+    _points = np.stack([np.linspace(-50, 50, 20), np.full(20, 100)], axis=1)
+    report = preflight(_points)
+    assert report and not report.issues
+    assert report.angles.shape == (20, 2)
+
+def test_preflight_reports_runs_per_shape():
+    # samples 3-5 are outside the domain, 4 is out of reach as well, the run is split at the shape boundary
+    _points = np.array([[0, 100]] * 8, dtype=float)
+    _points[3:6] = [[0, 60], [0, 400], [0, 60]]
+    _shape_index = np.array([0, 0, 0, 0, 0, 1, 1, 1])
+    report = preflight(_points, _shape_index)
+    assert not report
+    _issues = [(issue['shape'], issue['start'], issue['end'], issue['reason']) for issue in report.issues]
+    assert (0, 3, 4, REASON_DOMAIN) in _issues
+    assert (1, 5, 5, REASON_DOMAIN) in _issues
+    assert (0, 4, 4, REASON_UNREACHABLE) in _issues
+    assert [issue['start'] for issue in report.issues] == sorted(issue['start'] for issue in report.issues)
+    assert 'Preflight failed' in str(report)
+
+def test_preflight_index_offset():
+    report = preflight([[0, 100], [0, 400]], index_offset=256)
+    assert [(issue['start'], issue['end']) for issue in report.issues if issue['reason'] == REASON_UNREACHABLE] == [(257, 257)]
@@ -0,0 +1,56 @@
+import pytest
+from drawing_bot_api import scheduler
+from drawing_bot_api.scheduler import Pacing_scheduler
+
+class _Clock:
+    # time.monotonic / time.sleep stand-in, every reading advances it by a microsecond so busy-waits end
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        self.now += 1e-6
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+@pytest.fixture
+def clock(monkeypatch):
+    _clock = _Clock()
+    monkeypatch.setattr(scheduler, 'time', _clock)
+    return _clock
+
+def test_deadlines_are_absolute(clock):
+    pacer = Pacing_scheduler(period=0.005, catch_up_budget=0.05)
+    pacer.start()
+    for _index in range(10):
+        pacer.wait()
+        assert clock.now == pytest.approx(pacer.deadline(_index), abs=1e-5)
+    assert pacer.deadline(10) == pytest.approx(pacer.start_time + 0.05)
+
+def test_late_message_does_not_shift_the_following_ones(clock):
+    pacer = Pacing_scheduler(period=0.005, catch_up_budget=0.05)
+    pacer.start()
+    for _index in range(20):
+        if _index == 5:
+            clock.now += 0.02 # e.g. the process was descheduled
+        pacer.wait()
+    assert pacer.shift == 0
+    assert pacer.lateness[5] == pytest.approx(0.02 - 0.005, abs=1e-4) # message 5 was 15 ms late, 6 to 8 are sent at once
+    assert pacer.lateness[9] == pytest.approx(0, abs=1e-4)
+    assert clock.now == pytest.approx(pacer.deadline(19), abs=1e-4)
+
+def test_falling_behind_the_budget_moves_the_deadlines(clock):
+    pacer = Pacing_scheduler(period=0.005, catch_up_budget=0.05)
+    pacer.start()
+    pacer.wait()
+    clock.now += 0.2
+    pacer.wait()
+    assert pacer.shift == pytest.approx(0.2 - 0.005 - 0.05, abs=1e-4)
+    _report = pacer.report()
+    assert _report['messages'] == 2
+    assert _report['max_lateness'] == pytest.approx(0.195, abs=1e-4)
+    assert _report['duration'] == pytest.approx(_report['planned_duration'] + pacer.shift + pacer.lateness[-1])
+
+def test_report_without_messages():
+    assert Pacing_scheduler().report() == {'messages': 0}
@@ -0,0 +1,64 @@
+import time
+import pytest
+from drawing_bot_api.serial_handler import Serial_handler
+
+# Serial_handler against a bridge that never acknowledges a sequence marker (a bridge older than the in-flight window)
+
+class _Silent_connection:
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(bytes(data))
+
+    def recv(self, size, flags=0):
+        raise BlockingIOError()
+
+    def setblocking(self, flag):
+        pass
+
+    def close(self):
+        pass
+
+class _Silent_transport:
+    def __init__(self):
+        self.accepted = 0
+
+    def listen(self, timeout=20):
+        return self
+
+    def accept(self):
+        self.accepted += 1
+        return _Silent_connection(), 'silent'
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+def _messages(points):
+    return [f'{side}{0.01 * index:.2f}\n' for index in range(points) for side in 'WE']
+
+def test_window_fallback_is_reset_per_send(capsys):
+    handler = Serial_handler(persistent=True, transport=_Silent_transport(), health_port=None, window=4)
+    handler.period = 0.001
+    for _send in range(2):
+        _start = time.monotonic()
+        assert handler.send_messages(_messages(10), promting=False) is None
+        # every send waits for acknowledgements again before it falls back
+        assert time.monotonic() - _start >= 1
+        assert handler.window == 4
+    assert capsys.readouterr().out.count('does not acknowledge') == 2
+    handler.close()
+
+def test_stream_failing_at_once_does_not_connect():
+    def _messages():
+        raise ValueError('first chunk failed')
+        yield
+
+    transport = _Silent_transport()
+    handler = Serial_handler(transport=transport, health_port=None)
+    with pytest.raises(ValueError, match='first chunk'):
+        handler.send_stream(_messages(), promting=True) # a prompt would fail reading stdin
+    assert transport.accepted == 0
@@ -0,0 +1,277 @@
+import os
+import socket
+import time
+import asyncio
+from multiprocessing import shared_memory, resource_tracker
+from drawing_bot_api.config import *
+
+# Transports between the API (Serial_handler, listening side) and the bridge (serial_com, connecting side).
+# listen() returns a server with accept() -> (conn, addr), conn behaves like a connected socket
+# (sendall, recv with MSG_PEEK, setblocking, close). open_bridge_connection() is the asyncio side of the
+# bridge and returns a (reader, writer) pair like asyncio.open_connection.
+
+class Tcp_transport:
+    def __init__(self, host='localhost', port=SOCKET_PORT):
+        self.host = host
+        self.port = port
+
+    def listen(self, timeout=20):
+        _server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        _server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        _server.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+        _server.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _server.settimeout(timeout)
+        _server.bind((self.host, self.port))
+        _server.listen()
+        return _server
+
+    async def open_bridge_connection(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        _socket = writer.get_extra_info('socket')
+        _socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+        _socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return reader, writer
+
+    def __str__(self):
+        return f'tcp://{self.host}:{self.port}'
+
+class Unix_transport:
+    # AF_UNIX stream socket, skips the loopback TCP stack and allows one socket path per bot
+    def __init__(self, path=SOCKET_PATH):
+        self.path = path
+
+    def listen(self, timeout=20):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        _server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        _server.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+        _server.settimeout(timeout)
+        _server.bind(self.path)
+        _server.listen()
+        return _server
+
+    async def open_bridge_connection(self):
+        return await asyncio.open_unix_connection(self.path)
+
+    def __str__(self):
+        return f'unix://{self.path}'
+
+# Shared memory layout: a header of 8 byte words followed by two single-producer single-consumer byte rings,
+# one from the API to the bridge and one back.
+_API_WRITE, _API_READ, _BRIDGE_WRITE, _BRIDGE_READ, _LISTENING, _STATE = range(6)
+_HEADER_SIZE = 64
+_WAITING, _CONNECTED, _BRIDGE_CLOSED, _API_CLOSED = range(4)
+_POLL = 0.0001 # seconds between polls of a ring that is empty or full
+_SPIN = SHM_SPIN # seconds a reader busy-polls an empty ring before it starts sleeping between polls
+_ATTACH_WAIT = 1.0 # seconds the bridge waits on one segment for accept(), then run() checks the port and attaches again
+
+class Shm_transport:
+    # multiprocessing.shared_memory ring buffers carrying the encoded frames without any system call per message
+    def __init__(self, name=SHM_NAME, ring_size=SHM_RING_SIZE):
+        self.name = name
+        self.ring_size = ring_size
+
+    def listen(self, timeout=20):
+        return _Shm_server(self, timeout)
+
+    async def open_bridge_connection(self):
+        # A closed server unlinks its segment and the next one is created under the same name, so the bridge does not
+        # wait on a segment that stopped listening: it lets go of the mapping and run() attaches again by name, like
+        # it retries a refused TCP or unix connection.
+        _memory = _attach(self.name)
+        _header = _memory.buf[:_HEADER_SIZE].cast('Q')
+        _deadline = time.monotonic() + _ATTACH_WAIT
+        while not (_header[_LISTENING] and _header[_STATE] == _WAITING):
+            if not _header[_LISTENING] or time.monotonic() > _deadline:
+                _header.release()
+                _memory.close()
+                raise ConnectionRefusedError(f'{self} is not accepting')
+            await asyncio.sleep(BRIDGE_ATTACH_INTERVAL)
+        _header[_STATE] = _CONNECTED
+        _ring_size = (_memory.size - _HEADER_SIZE) // 2
+        _connection = _Shm_connection(_memory, _header, _ring_size, bridge_side=True)
+        return _Shm_reader(_connection), _Shm_writer(_connection)
+
+    def __str__(self):
+        return f'shm://{self.name}'
+
+def _attach(name):
+    _memory = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(_memory._name, 'shared_memory') # owned by the API side, do not unlink on exit
+    except Exception:
+        pass
+    return _memory
+
+class _Shm_server:
+    def __init__(self, transport, timeout):
+        self.timeout = timeout
+        self.ring_size = transport.ring_size
+        try:
+            shared_memory.SharedMemory(name=transport.name).unlink() # left over from a crashed run
+        except FileNotFoundError:
+            pass
+        self.memory = shared_memory.SharedMemory(name=transport.name, create=True, size=_HEADER_SIZE + 2 * transport.ring_size)
+        self.header = self.memory.buf[:_HEADER_SIZE].cast('Q')
+        self.header[_STATE] = _API_CLOSED
+        self.header[_LISTENING] = 1
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def accept(self):
+        for _index in (_API_WRITE, _API_READ, _BRIDGE_WRITE, _BRIDGE_READ):
+            self.header[_index] = 0
+        self.header[_STATE] = _WAITING
+        _deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        while self.header[_STATE] != _CONNECTED:
+            if _deadline is not None and time.monotonic() > _deadline:
+                self.header[_STATE] = _API_CLOSED
+                raise socket.timeout('timed out')
+            time.sleep(0.001)
+        return _Shm_connection(self.memory, self.header, self.ring_size, bridge_side=False), 'shm'
+
+    def close(self):
+        self.header[_LISTENING] = 0
+        self.header[_STATE] = _API_CLOSED
+        self.header.release()
+        try:
+            self.memory.close()
+        except BufferError: # a connection is still open
+            pass
+        resource_tracker.register(self.memory._name, 'shared_memory') # a bridge forked from this process unregistered it
+        self.memory.unlink()
+
+class _Shm_connection:
+    def __init__(self, memory, header, ring_size, bridge_side):
+        self.memory = memory
+        self.header = header
+        self.ring_size = ring_size
+        self.blocking = True
+        _rings = (memory.buf[_HEADER_SIZE:_HEADER_SIZE + ring_size], memory.buf[_HEADER_SIZE + ring_size:_HEADER_SIZE + 2 * ring_size])
+        if bridge_side:
+            self.out_ring, self.in_ring = _rings[1], _rings[0]
+            self.out_indices, self.in_indices = (_BRIDGE_WRITE, _BRIDGE_READ), (_API_WRITE, _API_READ)
+            self.own_close, self.peer_close = _BRIDGE_CLOSED, _API_CLOSED
+        else:
+            self.out_ring, self.in_ring = _rings[0], _rings[1]
+            self.out_indices, self.in_indices = (_API_WRITE, _API_READ), (_BRIDGE_WRITE, _BRIDGE_READ)
+            self.own_close, self.peer_close = _API_CLOSED, _BRIDGE_CLOSED
+        self.closed = False
+
+    def peer_closed(self):
+        return self.header[_STATE] != _CONNECTED
+
+    def setblocking(self, flag):
+        self.blocking = flag
+
+    def sendall(self, data):
+        _data = memoryview(data).cast('B')
+        _write, _read = self.out_indices
+        while len(_data):
+            if self.peer_closed():
+                raise BrokenPipeError('shared memory peer closed')
+            _head = self.header[_write]
+            _free = self.ring_size - (_head - self.header[_read])
+            if not _free:
+                time.sleep(_POLL)
+                continue
+            _start = _head % self.ring_size
+            _size = min(_free, len(_data), self.ring_size - _start)
+            self.out_ring[_start:_start + _size] = _data[:_size]
+            self.header[_write] = _head + _size # published after the data is in place
+            _data = _data[_size:]
+
+    def send_available(self, data):
+        # non-blocking sendall, drops what does not fit into the ring
+        try:
+            _write, _read = self.out_indices
+            _free = self.ring_size - (self.header[_write] - self.header[_read])
+            _data = memoryview(data).cast('B')[:_free]
+            if len(_data) and not self.peer_closed():
+                self.sendall(_data)
+        except (BrokenPipeError, ValueError):
+            pass
+
+    def recv(self, size, flags=0):
+        _write, _read = self.in_indices
+        _spin_until = time.perf_counter() + _SPIN
+        while True:
+            _tail = self.header[_read]
+            _available = self.header[_write] - _tail
+            if _available:
+                break
+            if self.peer_closed():
+                return b''
+            if not self.blocking:
+                raise BlockingIOError()
+            if time.perf_counter() > _spin_until:
+                time.sleep(_POLL)
+        _start = _tail % self.ring_size
+        _size = min(_available, size, self.ring_size - _start)
+        data = bytes(self.in_ring[_start:_start + _size])
+        if not flags & socket.MSG_PEEK:
+            self.header[_read] = _tail + _size
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.header[_STATE] == _CONNECTED:
+            self.header[_STATE] = self.own_close
+        self.in_ring.release()
+        self.out_ring.release()
+
+class _Shm_reader:
+    # asyncio.StreamReader look-alike for the bridge, polls the ring
+    def __init__(self, connection):
+        self.connection = connection
+        self.connection.setblocking(False)
+
+    async def read(self, size):
+        _spin_until = time.perf_counter() + _SPIN
+        while True:
+            try:
+                return self.connection.recv(size)
+            except BlockingIOError:
+                if time.perf_counter() > _spin_until:
+                    await asyncio.sleep(_POLL)
+
+class _Shm_writer:
+    # asyncio.StreamWriter look-alike for the bridge
+    def __init__(self, connection):
+        self.connection = connection
+
+    def get_extra_info(self, name):
+        return None
+
+    def write(self, data):
+        # like the outbound queue of the bridge this direction is lossy, a full ring drops data instead of blocking
+        self.connection.send_available(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.connection.close()
+        self.connection.header.release()
+        self.connection.memory.close()
+
+TRANSPORTS = {
+    'tcp': Tcp_transport,
+    'unix': Unix_transport,
+    'shm': Shm_transport,
+}
+
+def make_transport(name=TRANSPORT, address=None):
+    # address: TCP port, socket path or shared memory name, None uses the default of the transport from config.py
+    if not isinstance(name, str):
+        return name
+    if name not in TRANSPORTS:
+        raise ValueError(f'Unknown transport "{name}", valid: {", ".join(TRANSPORTS)}')
+    if address is None:
+        return TRANSPORTS[name]()
+    if name == 'tcp':
+        return Tcp_transport(port=int(address))
+    return TRANSPORTS[name](address)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tty
+import time
+import select
+import threading
+from drawing_bot_api.config import *
+
+# Emulates the ESP32 Commander protocol on a pseudo-terminal, so the bridge can run without the board:
+# python virtual_robot.py           prints the port to pass to serial_com.py --port
+# W<angle> / E<angle>  motion targets of the left / right motor
+# I                    replies RDY once homing is done
+# R                    restart, homes again
+# _                    probe, ignored
+# Bytes are consumed at the speed of the configured baud rate (8N1), so a bridge that writes too much
+# blocks the same way it would on the real UART.
+# monitor_rate: lines per second of SimpleFOC monitor output (MONITOR_VARIABLES of the MONITOR_AXIS motor), 0 disables
+# it. The motor is ideal, the reported angle is the current target.
+class Virtual_robot:
+    def __init__(self, baud=BAUD, homing_time=0.0, history=100000, monitor_rate=0):
+        self.baud = baud
+        self.homing_time = homing_time
+        self.history = history
+        self.monitor_rate = monitor_rate
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+        self.reset_stats()
+        self.restart()
+
+    def reset_stats(self):
+        with self.lock:
+            self.bytes_received = 0
+            self.commands = {'W': 0, 'E': 0, 'I': 0, 'R': 0, '_': 0, 'invalid': 0}
+            self.targets = [] # (time, side, value) of the last history motion commands
+            self.first_command = None
+            self.last_command = None
+
+    def restart(self):
+        self.target = {'W': 0.0, 'E': 0.0}
+        self.ready_at = time.monotonic() + self.homing_time
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if self.monitor_rate:
+            threading.Thread(target=self._monitor, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run(self):
+        _byte_time = 10 / self.baud
+        _line_clock = time.monotonic() # when the UART finished receiving the last byte
+        _pending = b''
+        while self.running:
+            _readable, _, _ = select.select([self.master], [], [], 0.05)
+            if not _readable:
+                continue
+            try:
+                data = os.read(self.master, 64)
+            except OSError:
+                return
+
+            # the UART needs len(data) byte times to receive this
+            _line_clock = max(_line_clock, time.monotonic()) + len(data) * _byte_time
+            _wait = _line_clock - time.monotonic()
+            if _wait > 0:
+                time.sleep(_wait)
+
+            _pending += data
+            *_lines, _pending = _pending.split(b'\n')
+            with self.lock:
+                self.bytes_received += len(data)
+                for _line in _lines:
+                    self._handle(_line.strip())
+
+    def _monitor(self):
+        _side = 'WE'[MONITOR_AXIS]
+        _next = time.monotonic()
+        while self.running:
+            _next += 1 / self.monitor_rate
+            time.sleep(max(0.0, _next - time.monotonic()))
+            with self.lock:
+                _values = {'target': self.target[_side], 'velocity': 0.0, 'angle': self.target[_side]}
+            try:
+                os.write(self.master, ('\t'.join(f'{_values[_name]:.4f}' for _name in MONITOR_VARIABLES) + '\n').encode('utf-8'))
+            except OSError:
+                return
+
+    def _handle(self, line):
+        if not line:
+            return
+        _now = time.monotonic()
+        _command = chr(line[0])
+        if _command in ('W', 'E'):
+            try:
+                self.target[_command] = float(line[1:])
+            except ValueError:
+                self.commands['invalid'] += 1
+                return
+            self.commands[_command] += 1
+            self.targets.append((_now, _command, self.target[_command]))
+            if len(self.targets) > self.history:
+                del self.targets[:len(self.targets) - self.history]
+            if self.first_command is None:
+                self.first_command = _now
+            self.last_command = _now
+        elif _command == 'I':
+            self.commands['I'] += 1
+            if _now >= self.ready_at:
+                os.write(self.master, b'RDY\n')
+        elif _command == 'R':
+            self.commands['R'] += 1
+            self.restart()
+        elif _command == '_':
+            self.commands['_'] += 1
+        else:
+            self.commands['invalid'] += 1
+
+    def stats(self):
+        with self.lock:
+            _motion = self.commands['W'] + self.commands['E']
+            _duration = (self.last_command - self.first_command) if self.first_command is not None else 0.0
+            return {
+                'port': self.port,
+                'bytes': self.bytes_received,
+                'commands': dict(self.commands),
+                'motion_commands': _motion,
+                'duration': _duration,
+                'commands_per_second': _motion / _duration if _duration else 0.0,
+                'target': dict(self.target),
+            }
+
+if __name__ == '__main__':
+    baud = int(sys.argv[1]) if len(sys.argv) > 1 else BAUD
+    with Virtual_robot(baud=baud) as robot:
+        print(f'Virtual robot listening on {robot.port} ({baud} baud). Start the bridge with: python serial_com.py --port {robot.port}')
+        try:
+            while True:
+                time.sleep(5)
+                print(robot.stats())
+        except KeyboardInterrupt:
+            pass